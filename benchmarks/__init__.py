@@ -0,0 +1,10 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Benchmarks
+
+Scripts that measure the performance of the library without talking to Lulu. Each script is run as a module from the
+directory that contains the LuluAPI package, for example:
+
+    python -m LuluAPI.benchmarks.session_latency
+"""
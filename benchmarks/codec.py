@@ -0,0 +1,77 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- JSON Codec Benchmark
+
+Times every installed codec in lulu_codec.py on payloads the library really sends and receives: decoding a page of
+print-jobs from lulu_get_print_jobs(), and encoding the body of lulu_create_print_job() with many line items.
+
+    python -m LuluAPI.benchmarks.codec [--jobs 1000] [--line-items 50] [--repeat 20]
+"""
+
+import argparse
+import time
+
+import LuluAPI.lulu_codec as codec
+from LuluAPI.benchmarks import fixtures
+
+
+def create_print_job_payload(line_item_count):
+    job = fixtures.print_job(1, line_item_count)
+    return {
+        "line_items": [
+            {
+                "external_id": item["external_id"],
+                "printable_normalization": {
+                    "cover": {"source_url": item["printable_normalization"]["cover"]["source_url"]},
+                    "interior": {"source_url": item["printable_normalization"]["interior"]["source_url"]},
+                    "pod_package_id": item["printable_normalization"]["pod_package_id"],
+                },
+                "quantity": item["quantity"],
+                "title": item["title"],
+            }
+            for item in job["line_items"]
+        ],
+        "shipping_address": {key: value for key, value in job["shipping_address"].items()
+                             if key not in ("warnings", "suggested_address")},
+        "shipping_level": job["shipping_level"],
+        "contact_email": job["contact_email"],
+        "external_id": job["external_id"],
+        "production_delay": job["production_delay"],
+    }
+
+
+def best_time(function, argument, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--line-items", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    codecs = codec.available_codecs()
+    page_body = codecs["json"][0](fixtures.print_jobs_page(args.jobs))
+    create_body = create_print_job_payload(args.line_items)
+    print(f"decode: print-jobs page, {args.jobs} jobs, {len(page_body) / 1024:.0f} KiB")
+    print(f"encode: create_print_job body, {args.line_items} line items")
+    for name, (dumps, loads) in codecs.items():
+        # Every codec must read back exactly what the others do.
+        assert loads(dumps(create_body)) == create_body
+        decode = best_time(loads, page_body, args.repeat)
+        encode = best_time(dumps, create_body, args.repeat * 10)
+        print(f"{name:<8} decode {decode * 1000:8.3f} ms   encode {encode * 1000000:8.1f} us")
+    codec.loads(b"{}")
+    print(f"in use: {codec.CODEC}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,780 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Fake Lulu Server
+
+A local stand-in for Lulu's API, so the library can be benchmarked and load tested end to end without the sandbox. It
+answers every endpoint request.py uses, with responses shaped like Lulu's:
+
+    - The token endpoint, which accepts any credentials, and a 401 for any request without a token it issued
+    - print-jobs: creating, listing (with filters and pagination), statistics, a single print-job, its costs, its status
+      and cancelling it
+    - print-job-cost-calculations and shipping-options, priced from the page count, quantity and shipping level
+    - validate-interior and validate-cover, which finish validating after a set time
+    - webhooks and webhook-submissions
+
+Print-jobs move through Lulu's statuses on their own, one step every --step-seconds: CREATED, UNPAID,
+PAYMENT_IN_PROGRESS, PRODUCTION_DELAYED, PRODUCTION_READY, IN_PRODUCTION and SHIPPED. Each change updates date_modified
+and is sent to every active webhook subscribed to PRINT_JOB_STATUS_CHANGED, signed with Lulu-HMAC-SHA256 using --secret.
+
+Every request can be slowed down, failed or throttled:
+
+    --latency: (seconds) Added to every response, give or take --latency-jitter (a fraction of it)
+    --error-rate: (0 to 1) The fraction of requests answered with a 500 or 503
+    --throttle-rate: (0 to 1) The fraction of requests answered with a 429 and a Retry-After header
+    --rate-limit: (requests per second) Requests beyond this rate are answered with a 429, like Lulu's own throttling
+
+Run it on its own and point the library at it:
+
+    python -m LuluAPI.benchmarks.fake_lulu --port 8080 --jobs 500 --latency 0.05 --error-rate 0.01
+    LULU_URLPREFIX=http://127.0.0.1:8080/ python my_script.py
+
+Or start it from Python, for example in a benchmark:
+
+    server = FakeLulu(latency=0.02, jobs=1000).start()
+    request.set_url_prefix(server.url)
+    ...
+    server.stop()
+
+GET /_fake/stats returns the server's own counts of requests, errors, throttled requests, print-jobs and webhook deliveries.
+"""
+
+import argparse
+import copy
+import hashlib
+import hmac
+import itertools
+import json
+import math
+import queue
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from LuluAPI.benchmarks import fixtures
+
+LIFECYCLE = ("CREATED", "UNPAID", "PAYMENT_IN_PROGRESS", "PRODUCTION_DELAYED", "PRODUCTION_READY", "IN_PRODUCTION",
+             "SHIPPED")
+CANCELABLE = ("CREATED", "UNPAID", "PAYMENT_IN_PROGRESS", "PRODUCTION_DELAYED")
+STATUSES = LIFECYCLE + ("ERROR", "CANCELED", "REJECTED")
+
+# Each shipping level's cost, and the fewest and most days from dispatch to delivery.
+SHIPPING_LEVELS = {
+    "MAIL": (Decimal("4.99"), 8, 14),
+    "PRIORITY_MAIL": (Decimal("7.99"), 5, 9),
+    "GROUND_HD": (Decimal("9.49"), 4, 7),
+    "GROUND_BUS": (Decimal("9.49"), 4, 7),
+    "GROUND": (Decimal("8.99"), 4, 7),
+    "EXPEDITED": (Decimal("17.99"), 2, 3),
+    "EXPRESS": (Decimal("29.99"), 1, 2),
+}
+TAX_RATE = Decimal("0.0725")
+FULFILLMENT_COST = Decimal("0.75")
+CENT = Decimal("0.01")
+
+STATUS_CHANGED = "PRINT_JOB_STATUS_CHANGED"
+
+
+def _iso(moment):
+    return moment.isoformat().replace("+00:00", "Z")
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _parse_time(value):
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def _money(value):
+    return str(value.quantize(CENT))
+
+
+def _cost(amount):
+    tax = (amount * TAX_RATE).quantize(CENT)
+    return {
+        "tax_rate": str(TAX_RATE),
+        "total_cost_excl_tax": _money(amount),
+        "total_cost_incl_tax": _money(amount + tax),
+        "total_tax": _money(tax),
+    }
+
+
+class _ApiError(Exception):
+    def __init__(self, status, body, headers=None):
+        super().__init__(status)
+        self.status = status
+        self.body = body
+        self.headers = headers
+
+
+class FakeLulu:
+    def __init__(self, latency=0.0, latency_jitter=0.5, error_rate=0.0, throttle_rate=0.0, rate_limit=None, step_seconds=5.0,
+                 validation_seconds=1.0, token_ttl=3600, secret="fake-lulu-secret", jobs=0, seed=None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.step_seconds = step_seconds
+        self.validation_seconds = validation_seconds
+        self.token_ttl = token_ttl
+        self.secret = secret
+        self.counts = {"requests": 0, "errors": 0, "throttled": 0, "unauthorized": 0, "webhook_deliveries": 0,
+                       "webhook_failures": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1001)
+        self._tokens = {}
+        self._print_jobs = {}
+        # Each print-job id still moving through LIFECYCLE, mapped to the time.monotonic() of its first status.
+        self._moving = {}
+        self._validations = {"interior": {}, "cover": {}}
+        self._webhooks = {}
+        self._submissions = []
+        self._deliveries = queue.Queue()
+        self._allowance = float(rate_limit or 0)
+        self._allowance_updated = time.monotonic()
+        self._server = None
+        self._threads = []
+        self._running = False
+        for _ in range(jobs):
+            self._seed_print_job()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self, host="127.0.0.1", port=0):
+        self._server = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._running = True
+        for target in (self._server.serve_forever, self._advance_forever, self._deliver_forever):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._running = False
+        self._deliveries.put(None)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def stats(self):
+        with self._lock:
+            return {**self.counts, "print_jobs": len(self._print_jobs), "moving": len(self._moving),
+                    "webhooks": len(self._webhooks)}
+
+    # ---- Faults ----
+
+    def _fault(self):
+        if self.latency:
+            jitter = self.latency * self.latency_jitter
+            time.sleep(max(0.0, self._random.uniform(self.latency - jitter, self.latency + jitter)))
+        with self._lock:
+            self.counts["requests"] += 1
+            if self.rate_limit:
+                now = time.monotonic()
+                self._allowance = min(float(self.rate_limit),
+                                      self._allowance + (now - self._allowance_updated) * self.rate_limit)
+                self._allowance_updated = now
+                if self._allowance < 1:
+                    self.counts["throttled"] += 1
+                    retry_after = math.ceil((1 - self._allowance) / self.rate_limit)
+                    raise _ApiError(429, {"detail": f"Request was throttled. Expected available in {retry_after} second."},
+                                    {"Retry-After": str(retry_after)})
+                self._allowance -= 1
+            roll = self._random.random()
+            if roll < self.throttle_rate:
+                self.counts["throttled"] += 1
+                raise _ApiError(429, {"detail": "Request was throttled. Expected available in 1 second."},
+                                {"Retry-After": "1"})
+            if roll < self.throttle_rate + self.error_rate:
+                self.counts["errors"] += 1
+                status = self._random.choice((500, 503))
+                raise _ApiError(status, {"detail": "Internal server error" if status == 500 else "Service unavailable"})
+
+    def _authorize(self, authorization):
+        token = (authorization or "").partition("Bearer ")[2]
+        with self._lock:
+            expires = self._tokens.get(token)
+            if expires is None or expires < time.monotonic():
+                self.counts["unauthorized"] += 1
+                raise _ApiError(401, {"detail": "Authentication credentials were not provided."})
+
+    # ---- Token ----
+
+    # Any client key and secret are accepted, so the library works against it with whatever credentials it has.
+    def issue_token(self):
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._tokens[token] = time.monotonic() + self.token_ttl
+        return 200, {"access_token": token, "expires_in": self.token_ttl, "token_type": "Bearer",
+                     "scope": "profile email"}
+
+    # ---- Print-jobs ----
+
+    def _new_print_job(self, id, line_items, shipping_address, shipping_level, contact_email, external_id,
+                       production_delay, created):
+        job = copy.deepcopy(fixtures.PRINT_JOB)
+        template_item = job["line_items"][0]
+        job.update({
+            "id": id,
+            "order_id": str(200000 + id),
+            "external_id": external_id,
+            "child_job_ids": [],
+            "date_created": _iso(created),
+            "date_modified": _iso(created),
+            "contact_email": contact_email,
+            "production_delay": production_delay,
+            "production_due_time": _iso(created + timedelta(minutes=production_delay)),
+            "shipping_level": shipping_level,
+            "tax_country": shipping_address.get("country_code"),
+            "shipping_address": {**shipping_address, "warnings": [], "suggested_address": None},
+        })
+        _, fastest, slowest = SHIPPING_LEVELS[shipping_level]
+        dispatch = created.date() + timedelta(days=3)
+        job["estimated_shipping_dates"] = {
+            "dispatch_min": str(dispatch),
+            "dispatch_max": str(dispatch + timedelta(days=1)),
+            "arrival_min": str(dispatch + timedelta(days=fastest)),
+            "arrival_max": str(dispatch + timedelta(days=slowest + 1)),
+        }
+        job["line_items"] = []
+        for index, line_item in enumerate(line_items):
+            item = copy.deepcopy(template_item)
+            normalization = line_item.get("printable_normalization") or {}
+            for kind in ("cover", "interior"):
+                source = line_item.get(kind) or normalization.get(kind) or {}
+                if isinstance(source, str):
+                    source = {"source_url": source}
+                item["printable_normalization"][kind].update({
+                    "job_id": None,
+                    "normalized_file": None,
+                    "source_url": source.get("source_url"),
+                    "source_md5_sum": source.get("source_md5_sum"),
+                })
+            item["printable_normalization"]["pod_package_id"] = (line_item.get("pod_package_id")
+                                                                 or normalization.get("pod_package_id"))
+            item.update({
+                "id": id * 100 + index,
+                "external_id": line_item.get("external_id"),
+                "printable_id": line_item.get("printable_id") or str(uuid.uuid4()),
+                "quantity": line_item["quantity"],
+                "title": line_item.get("title"),
+                "tracking_id": None,
+                "tracking_urls": None,
+            })
+            job["line_items"].append(item)
+        job["costs"] = self._price(
+            [{"page_count": item["printable_normalization"]["interior"].get("page_count") or 212,
+              "quantity": item["quantity"]} for item in job["line_items"]], shipping_level)
+        self._set_status(job, "CREATED", created)
+        return job
+
+    def _set_status(self, job, status, moment):
+        job["status"] = {"name": status, "message": f"Print-job is {status.lower().replace('_', ' ')}",
+                         "changed": _iso(moment)}
+        job["date_modified"] = _iso(moment)
+        for item in job["line_items"]:
+            messages = {"info": f"Line item is {status.lower().replace('_', ' ')}.", "timestamp": _iso(moment)}
+            if status == "SHIPPED":
+                item["tracking_id"] = f"1Z{item['id']:016d}"
+                item["tracking_urls"] = [f"https://tracking.example.com/{item['tracking_id']}"]
+                messages.update({"tracking_id": item["tracking_id"], "tracking_urls": item["tracking_urls"],
+                                 "carrier_name": "UPS"})
+            item["status"] = {"name": status, "messages": messages}
+
+    def _seed_print_job(self):
+        id = next(self._ids)
+        age = self._random.uniform(0, self.step_seconds * len(LIFECYCLE))
+        created = _now() - timedelta(days=self._random.uniform(0, 90))
+        address = {key: value for key, value in fixtures.PRINT_JOB["shipping_address"].items()
+                   if key not in ("warnings", "suggested_address")}
+        address["country_code"] = self._random.choice(("US", "US", "US", "CA", "GB", "AU", "DE"))
+        job = self._new_print_job(id, [{"quantity": self._random.randint(1, 5), "title": f"Book {id}",
+                                        "external_id": f"item-{id}-1", "pod_package_id": "0850X1100FCPRECW080CW444MXX"}],
+                                  address, self._random.choice(tuple(SHIPPING_LEVELS)), "orders@example.com",
+                                  f"order-{id}", 60, created)
+        self._print_jobs[id] = job
+        self._moving[id] = time.monotonic() - age
+        self._advance(id, deliver=False)
+
+    # Moves a print-job to the status it should have reached by now. Must be called with self._lock held.
+    def _advance(self, id, deliver=True):
+        job = self._print_jobs[id]
+        stage = min(len(LIFECYCLE) - 1, int((time.monotonic() - self._moving[id]) / self.step_seconds))
+        status = LIFECYCLE[stage]
+        if status != job["status"]["name"]:
+            self._set_status(job, status, _now())
+            if deliver:
+                self._queue_webhooks(STATUS_CHANGED, job)
+        if status == LIFECYCLE[-1]:
+            del self._moving[id]
+
+    def _advance_forever(self):
+        while self._running:
+            with self._lock:
+                for id in list(self._moving):
+                    self._advance(id)
+            time.sleep(min(0.1, self.step_seconds / 10))
+
+    def _require_print_job(self, id):
+        job = self._print_jobs.get(int(id))
+        if job is None:
+            raise _ApiError(404, {"detail": "Not found."})
+        return job
+
+    def create_print_job(self, body):
+        errors = {}
+        for field in ("line_items", "shipping_address", "shipping_level", "contact_email"):
+            if not body.get(field):
+                errors[field] = ["This field is required."]
+        if body.get("shipping_level") and body["shipping_level"] not in SHIPPING_LEVELS:
+            errors["shipping_level"] = [f"\"{body['shipping_level']}\" is not a valid choice."]
+        address = body.get("shipping_address") or {}
+        for field in ("street1", "city", "country_code", "postcode", "phone_number"):
+            if address and not address.get(field):
+                errors.setdefault("shipping_address", {})[field] = ["This field is required."]
+        for index, line_item in enumerate(body.get("line_items") or []):
+            if not line_item.get("quantity"):
+                errors.setdefault("line_items", {})[str(index)] = {"quantity": ["This field is required."]}
+        if errors:
+            raise _ApiError(400, errors)
+        with self._lock:
+            id = next(self._ids)
+            job = self._new_print_job(id, body["line_items"], body["shipping_address"], body["shipping_level"],
+                                      body["contact_email"], body.get("external_id") or "",
+                                      body.get("production_delay") or 60, _now())
+            self._print_jobs[id] = job
+            self._moving[id] = time.monotonic()
+            return 201, job
+
+    def list_print_jobs(self, query, base_url):
+        with self._lock:
+            jobs = list(self._print_jobs.values())
+        jobs = [job for job in jobs if self._matches(job, query)]
+        ordering = query.get("ordering") or "-date_created"
+        jobs.sort(key=lambda job: (job.get(ordering.lstrip("-")) is None, job.get(ordering.lstrip("-")) or ""),
+                  reverse=ordering.startswith("-"))
+        page = self._page(jobs, query, base_url)
+        if query.get("exclude_line_items", "").lower() in ("true", "1"):
+            page["results"] = [{**job, "line_items": []} for job in page["results"]]
+        return 200, page
+
+    def _matches(self, job, query):
+        for field in ("id", "order_id"):
+            if query.get(field) and str(job[field]) != query[field]:
+                return False
+        if query.get("status") and job["status"]["name"] != query["status"]:
+            return False
+        for field, name in (("date_created", "created"), ("date_modified", "modified")):
+            moment = _parse_time(job[field])
+            after = _parse_time(query.get(f"{name}_after"))
+            before = _parse_time(query.get(f"{name}_before"))
+            if (after and moment <= after) or (before and moment >= before):
+                return False
+        search = query.get("search")
+        if search and not any(search in str(value) for value in (
+                job["id"], job["external_id"], job["order_id"], job["status"]["name"],
+                *(item["external_id"] for item in job["line_items"]), *(item["title"] for item in job["line_items"]))):
+            return False
+        return True
+
+    def _page(self, items, query, base_url):
+        try:
+            page = int(query.get("page") or 1)
+            page_size = min(int(query.get("page_size") or 100), 1000)
+        except ValueError:
+            raise _ApiError(400, {"detail": "Invalid page."})
+        if page < 1 or (page > 1 and (page - 1) * page_size >= len(items)):
+            raise _ApiError(404, {"detail": "Invalid page."})
+
+        def link(number):
+            return f"{base_url}?{urlencode({**query, 'page': number, 'page_size': page_size})}"
+
+        return {
+            "count": len(items),
+            "next": link(page + 1) if page * page_size < len(items) else None,
+            "previous": link(page - 1) if page > 1 else None,
+            "results": items[(page - 1) * page_size:page * page_size],
+        }
+
+    def statistics(self, query):
+        status = query.get("status") or "CREATED"
+        with self._lock:
+            jobs = list(self._print_jobs.values())
+        return 200, {"count": sum(1 for job in jobs if self._matches(job, {**query, "status": status})),
+                     "status": status}
+
+    def get_print_job(self, id):
+        with self._lock:
+            return 200, self._require_print_job(id)
+
+    def get_print_job_costs(self, id):
+        with self._lock:
+            return 200, self._require_print_job(id)["costs"]
+
+    def get_print_job_status(self, id):
+        with self._lock:
+            return 200, self._require_print_job(id)["status"]
+
+    def update_print_job_status(self, id, body):
+        with self._lock:
+            job = self._require_print_job(id)
+            if body.get("name") != "CANCELED":
+                raise _ApiError(400, {"name": ["Only CANCELED can be set."]})
+            if job["status"]["name"] not in CANCELABLE:
+                raise _ApiError(409, {"detail": f"A print-job in {job['status']['name']} can't be canceled."})
+            self._moving.pop(job["id"], None)
+            self._set_status(job, "CANCELED", _now())
+            self._queue_webhooks(STATUS_CHANGED, job)
+            return 200, job["status"]
+
+    # ---- Prices ----
+
+    def _price(self, line_items, shipping_level):
+        line_item_costs = []
+        total = Decimal(0)
+        for line_item in line_items:
+            unit = (Decimal("2.00") + Decimal("0.012") * int(line_item.get("page_count") or 0)).quantize(CENT)
+            amount = unit * int(line_item["quantity"])
+            total += amount
+            line_item_costs.append({
+                "cost_excl_discounts": _money(unit),
+                "discounts": [],
+                "quantity": int(line_item["quantity"]),
+                "total_cost_excl_discounts": _money(amount),
+                "unit_tier_cost": None,
+                **_cost(amount),
+            })
+        shipping = SHIPPING_LEVELS[shipping_level][0]
+        total += shipping + FULFILLMENT_COST
+        totals = _cost(total)
+        return {
+            "currency": "USD",
+            "line_item_costs": line_item_costs,
+            "shipping_cost": _cost(shipping),
+            "fulfillment_cost": _cost(FULFILLMENT_COST),
+            "total_cost_excl_tax": totals["total_cost_excl_tax"],
+            "total_cost_incl_tax": totals["total_cost_incl_tax"],
+            "total_tax": totals["total_tax"],
+            "total_discount_amount": "0.00",
+        }
+
+    def _check_line_items(self, line_items):
+        errors = {}
+        for index, line_item in enumerate(line_items or []):
+            item_errors = {}
+            if len(line_item.get("pod_package_id") or "") != 27:
+                item_errors["pod_package_id"] = ["Invalid pod_package_id."]
+            if not line_item.get("page_count"):
+                item_errors["page_count"] = ["This field is required."]
+            if not line_item.get("quantity"):
+                item_errors["quantity"] = ["This field is required."]
+            if item_errors:
+                errors[str(index)] = item_errors
+        if not line_items:
+            raise _ApiError(400, {"line_items": ["This field is required."]})
+        if errors:
+            raise _ApiError(400, {"line_items": errors})
+
+    def calculate_cost(self, body):
+        self._check_line_items(body.get("line_items"))
+        shipping_option = body.get("shipping_option")
+        if shipping_option not in SHIPPING_LEVELS:
+            raise _ApiError(400, {"shipping_option": [f"\"{shipping_option}\" is not a valid choice."]})
+        if not (body.get("shipping_address") or {}).get("country_code"):
+            raise _ApiError(400, {"shipping_address": {"country_code": ["This field is required."]}})
+        return 200, {**self._price(body["line_items"], shipping_option), "shipping_address": body["shipping_address"]}
+
+    def shipping_options(self, body):
+        self._check_line_items(body.get("line_items"))
+        today = _now().date()
+        options = []
+        for id, (level, (cost, fastest, slowest)) in enumerate(SHIPPING_LEVELS.items(), 1):
+            options.append({
+                "id": id,
+                "level": level,
+                "cost_excl_tax": _money(cost),
+                "currency": body.get("currency") or "USD",
+                "business_only": level == "GROUND_BUS",
+                "home_only": level == "GROUND_HD",
+                "postbox_ok": level in ("MAIL", "PRIORITY_MAIL"),
+                "traceable": level not in ("MAIL",),
+                "min_dispatch_date": str(today + timedelta(days=3)),
+                "max_dispatch_date": str(today + timedelta(days=4)),
+                "min_delivery_date": str(today + timedelta(days=3 + fastest)),
+                "max_delivery_date": str(today + timedelta(days=4 + slowest)),
+                "total_days_min": 3 + fastest,
+                "total_days_max": 4 + slowest,
+            })
+        return 200, options
+
+    # ---- File validation ----
+
+    def post_validation(self, kind, body):
+        if not body.get("source_url"):
+            raise _ApiError(400, {"source_url": ["This field is required."]})
+        if kind == "cover" and not body.get("interior_page_count"):
+            raise _ApiError(400, {"interior_page_count": ["This field is required."]})
+        with self._lock:
+            id = next(self._ids)
+            record = {"id": id, "source_url": body["source_url"], "status": "VALIDATING", "page_count": None,
+                      "errors": None, "valid_pod_package_ids": None}
+            self._validations[kind][id] = (time.monotonic(), record, body)
+            return 201, record
+
+    def get_validation(self, kind, id):
+        with self._lock:
+            entry = self._validations[kind].get(int(id))
+            if entry is None:
+                raise _ApiError(404, {"detail": "Not found."})
+            started, record, body = entry
+            if record["status"] == "VALIDATING" and time.monotonic() - started >= self.validation_seconds:
+                if "invalid" in body["source_url"]:
+                    record.update({"status": "ERROR", "errors": ["The file could not be read as a PDF."]})
+                else:
+                    record.update({"status": "NORMALIZED" if kind == "cover" else "VALIDATED",
+                                   "page_count": str(body.get("interior_page_count") or 212),
+                                   "valid_pod_package_ids": [body.get("pod_package_id") or "0850X1100FCPRECW080CW444MXX"]})
+            return 200, record
+
+    # ---- Webhooks ----
+
+    def create_webhook(self, body):
+        if not body.get("url") or not body.get("topics"):
+            raise _ApiError(400, {"url": ["This field is required."], "topics": ["This field is required."]})
+        webhook = {"id": str(uuid.uuid4()), "is_active": True, "topics": body["topics"], "url": body["url"]}
+        with self._lock:
+            self._webhooks[webhook["id"]] = webhook
+        return 201, webhook
+
+    def list_webhooks(self):
+        with self._lock:
+            results = list(self._webhooks.values())
+        return 200, {"count": len(results), "next": None, "previous": None, "results": results}
+
+    def _require_webhook(self, id):
+        webhook = self._webhooks.get(id)
+        if webhook is None:
+            raise _ApiError(404, {"detail": "Not found."})
+        return webhook
+
+    def get_webhook(self, id):
+        with self._lock:
+            return 200, self._require_webhook(id)
+
+    def update_webhook(self, id, body):
+        with self._lock:
+            webhook = self._require_webhook(id)
+            webhook.update({key: body[key] for key in ("topics", "url", "is_active") if key in body})
+            return 200, webhook
+
+    def delete_webhook(self, id):
+        with self._lock:
+            self._require_webhook(id)
+            del self._webhooks[id]
+        return 200, {}
+
+    def test_webhook(self, id, topic):
+        with self._lock:
+            webhook = self._require_webhook(id)
+            job = next(iter(self._print_jobs.values()), None) or self._new_print_job(
+                0, [{"quantity": 1, "title": "Test", "pod_package_id": "0850X1100FCPRECW080CW444MXX"}],
+                dict(fixtures.PRINT_JOB["shipping_address"]), "MAIL", "orders@example.com", "test", 60, _now())
+            self._deliveries.put((webhook, topic, copy.deepcopy(job)))
+        return 200, "Test webhook submission queued"
+
+    # Must be called with self._lock held.
+    def _queue_webhooks(self, topic, job):
+        for webhook in self._webhooks.values():
+            if webhook["is_active"] and topic in webhook["topics"]:
+                self._deliveries.put((webhook, topic, copy.deepcopy(job)))
+
+    def _deliver_forever(self):
+        while True:
+            delivery = self._deliveries.get()
+            if delivery is None:
+                return
+            webhook, topic, job = delivery
+            body = json.dumps({"topic": topic, "data": job}).encode()
+            signature = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+            http_request = urllib.request.Request(webhook["url"], data=body, method="POST", headers={
+                "Content-Type": "application/json", "Lulu-HMAC-SHA256": signature})
+            try:
+                with urllib.request.urlopen(http_request, timeout=5) as response:
+                    response_code = response.status
+            except urllib.error.HTTPError as error:
+                response_code = error.code
+            except (OSError, ValueError):
+                response_code = 0
+            with self._lock:
+                success = 200 <= response_code < 300
+                self.counts["webhook_deliveries" if success else "webhook_failures"] += 1
+                self._submissions.append({
+                    "id": len(self._submissions) + 1,
+                    "webhook_id": webhook["id"],
+                    "topic": topic,
+                    "payload": {"topic": topic, "data": {"id": job["id"]}},
+                    "response_code": response_code,
+                    "is_success": success,
+                    "date_created": _iso(_now()),
+                })
+
+    def webhook_submissions(self, query, base_url):
+        with self._lock:
+            submissions = list(self._submissions)
+        for field in ("webhook_id", "response_code"):
+            if query.get(field) not in (None, ""):
+                submissions = [item for item in submissions if str(item[field]) == str(query[field])]
+        if query.get("is_success") not in (None, ""):
+            wanted = str(query["is_success"]).lower() in ("true", "1")
+            submissions = [item for item in submissions if item["is_success"] == wanted]
+        after = _parse_time(query.get("created_after"))
+        before = _parse_time(query.get("created_before"))
+        submissions = [item for item in submissions
+                       if not (after and _parse_time(item["date_created"]) <= after)
+                       and not (before and _parse_time(item["date_created"]) >= before)]
+        return 200, self._page(submissions[::-1], {key: str(value) for key, value in query.items()
+                                                   if value is not None}, base_url)
+
+
+# Each route is (method, path pattern, handler). The handler is called with the server, the match, the query, the JSON
+# body and the URL of the endpoint (for pagination links).
+_ROUTES = [
+    ("POST", r"auth/realms/glasstree/protocol/openid-connect/token", None),
+    ("GET", r"_fake/stats", lambda lulu, match, query, body, base: (200, lulu.stats())),
+    ("GET", r"print-jobs", lambda lulu, match, query, body, base: lulu.list_print_jobs(query, base)),
+    ("POST", r"print-jobs", lambda lulu, match, query, body, base: lulu.create_print_job(body)),
+    ("GET", r"print-jobs/statistics", lambda lulu, match, query, body, base: lulu.statistics(query)),
+    ("GET", r"print-jobs/(\d+)", lambda lulu, match, query, body, base: lulu.get_print_job(match[1])),
+    ("GET", r"print-jobs/(\d+)/costs", lambda lulu, match, query, body, base: lulu.get_print_job_costs(match[1])),
+    ("GET", r"print-jobs/(\d+)/status", lambda lulu, match, query, body, base: lulu.get_print_job_status(match[1])),
+    ("PUT", r"print-jobs/(\d+)/status",
+     lambda lulu, match, query, body, base: lulu.update_print_job_status(match[1], body)),
+    ("POST", r"print-job-cost-calculations", lambda lulu, match, query, body, base: lulu.calculate_cost(body)),
+    ("POST", r"shipping-options", lambda lulu, match, query, body, base: lulu.shipping_options(body)),
+    ("POST", r"validate-(interior|cover)", lambda lulu, match, query, body, base: lulu.post_validation(match[1], body)),
+    ("GET", r"validate-(interior|cover)/(\d+)",
+     lambda lulu, match, query, body, base: lulu.get_validation(match[1], match[2])),
+    ("GET", r"webhooks", lambda lulu, match, query, body, base: lulu.list_webhooks()),
+    ("POST", r"webhooks", lambda lulu, match, query, body, base: lulu.create_webhook(body)),
+    ("GET", r"webhooks/([\w-]+)", lambda lulu, match, query, body, base: lulu.get_webhook(match[1])),
+    ("PATCH", r"webhooks/([\w-]+)", lambda lulu, match, query, body, base: lulu.update_webhook(match[1], body)),
+    ("DELETE", r"webhooks/([\w-]+)", lambda lulu, match, query, body, base: lulu.delete_webhook(match[1])),
+    ("POST", r"webhooks/([\w-]+)/test-submission/(\w+)",
+     lambda lulu, match, query, body, base: lulu.test_webhook(match[1], match[2])),
+    # request.get_webhook_submissions() sends its filters as a JSON body, so both the body and the query are read.
+    ("GET", r"webhook-submissions",
+     lambda lulu, match, query, body, base: lulu.webhook_submissions({**(body or {}), **query}, base)),
+]
+_ROUTES = [(method, re.compile(pattern), handler) for method, pattern, handler in _ROUTES]
+
+
+def _handler_for(lulu):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Without this, small responses on a kept-alive connection wait for the client's delayed ACK.
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _respond(self, status, body, headers=None):
+            content = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def _handle(self):
+            content = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            parsed = urlparse(self.path)
+            path = parsed.path.strip("/")
+            query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+            base_url = f"http://{self.headers.get('Host')}{parsed.path}"
+            try:
+                for method, pattern, handler in _ROUTES:
+                    match = pattern.fullmatch(path)
+                    if match is None or method != self.command:
+                        continue
+                    if handler is None:
+                        lulu._fault()
+                        return self._respond(*lulu.issue_token())
+                    if not path.startswith("_fake"):
+                        lulu._fault()
+                        lulu._authorize(self.headers.get("Authorization"))
+                    body = {}
+                    if content:
+                        try:
+                            body = json.loads(content)
+                        except ValueError:
+                            raise _ApiError(400, {"detail": "JSON parse error"})
+                    return self._respond(*handler(lulu, match, query, body, base_url))
+                self._respond(404, {"detail": "Not found."})
+            except _ApiError as error:
+                self._respond(error.status, error.body, error.headers)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--jobs", type=int, default=0, help="Print-jobs to start with, spread across the statuses")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--step-seconds", type=float, default=5.0)
+    parser.add_argument("--validation-seconds", type=float, default=1.0)
+    parser.add_argument("--token-ttl", type=int, default=3600)
+    parser.add_argument("--secret", default="fake-lulu-secret")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    lulu = FakeLulu(latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                    throttle_rate=args.throttle_rate, rate_limit=args.rate_limit, step_seconds=args.step_seconds,
+                    validation_seconds=args.validation_seconds, token_ttl=args.token_ttl, secret=args.secret,
+                    jobs=args.jobs, seed=args.seed)
+    lulu.start(args.host, args.port)
+    print(f"Fake Lulu API at {lulu.url}")
+    print(f"Point the library at it with LULU_URLPREFIX={lulu.url} or request.set_url_prefix(\"{lulu.url}\")")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        lulu.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Benchmark Fixtures
+
+Recorded Lulu responses, and helpers that copy them into payloads of realistic sizes.
+
+print_job(id=None, line_items=1): Returns a copy of the recorded print-job, with a new id and the given number of line items.
+print_jobs_page(count, line_items=1, first_id=1): Returns a lulu_get_print_jobs() response with count print-jobs in its results.
+create_print_job_input(line_items=1): Returns the master dictionary create_print_job() takes, with the given number of line items.
+created_print_job(id=None, line_items=1): Returns the lulu_create_print_job() response for a print-job that was just created.
+"""
+
+import copy
+import json
+import os
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+with open(os.path.join(FIXTURE_DIR, "print_job.json"), encoding="utf-8") as fixture_file:
+    PRINT_JOB = json.load(fixture_file)
+
+
+def print_job(id=None, line_items=1):
+    job = copy.deepcopy(PRINT_JOB)
+    if id is not None:
+        job["id"] = id
+        job["external_id"] = f"order-{id}"
+        job["order_id"] = str(200000 + id)
+    template_item = job["line_items"][0]
+    template_cost = job["costs"]["line_item_costs"][0]
+    job["line_items"] = []
+    job["costs"]["line_item_costs"] = []
+    for index in range(line_items):
+        item = copy.deepcopy(template_item)
+        item["id"] = job["id"] * 100 + index
+        item["external_id"] = f"{job['external_id']}-{index + 1}"
+        job["line_items"].append(item)
+        job["costs"]["line_item_costs"].append(copy.deepcopy(template_cost))
+    return job
+
+
+def print_jobs_page(count, line_items=1, first_id=1):
+    return {
+        "count": count,
+        "next": None,
+        "previous": None,
+        "results": [print_job(first_id + index, line_items) for index in range(count)],
+    }
+
+
+def create_print_job_input(line_items=1):
+    job = print_job(1, line_items)
+    shipping_information = {key: value for key, value in job["shipping_address"].items()
+                            if key not in ("warnings", "suggested_address")}
+    shipping_information["level"] = job["shipping_level"]
+    return {
+        "line_items": [
+            {
+                "external_id": item["external_id"],
+                "printable_normalization": {
+                    "cover": {"source_url": item["printable_normalization"]["cover"]["source_url"]},
+                    "interior": {"source_url": item["printable_normalization"]["interior"]["source_url"]},
+                    "pod_package_id": item["printable_normalization"]["pod_package_id"],
+                },
+                "quantity": item["quantity"],
+                "title": item["title"],
+            }
+            for item in job["line_items"]
+        ],
+        "shipping_information": shipping_information,
+        "external_id": job["external_id"],
+        "production_delay": job["production_delay"],
+    }
+
+
+# Lulu answers a new print-job before it has normalized the files or started production.
+def created_print_job(id=None, line_items=1):
+    job = print_job(id, line_items)
+    job["status"] = {"name": "CREATED", "message": "", "changed": job["date_created"]}
+    job["date_modified"] = job["date_created"]
+    for item in job["line_items"]:
+        item["status"] = {"messages": {}, "name": "CREATED"}
+        for kind in ("cover", "interior"):
+            item["printable_normalization"][kind]["normalized_file"] = None
+            item["printable_normalization"][kind]["job_id"] = None
+    return job
@@ -0,0 +1,92 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Import Time Benchmark
+
+Imports LuluAPI.request in a fresh interpreter with python -X importtime and reports how long the import took. Any socket
+that is created during the import is recorded. The script exits with status 1 if the import opens a socket or takes longer
+than the limit, so it can be used as a check in CI.
+
+    python -m LuluAPI.benchmarks.import_time [--module LuluAPI.request] [--limit-ms 25] [--runs 5]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# Runs inside the child interpreter. Every socket that is created is reported on stdout before the import goes on.
+CHILD_SCRIPT = """
+import socket
+_original_socket = socket.socket
+class _RecordingSocket(_original_socket):
+    def __init__(self, *args, **kwargs):
+        print("SOCKET OPENED", flush=True)
+        super().__init__(*args, **kwargs)
+socket.socket = _RecordingSocket
+import {module}
+"""
+
+# -X importtime lines look like: "import time:       123 |       4567 | LuluAPI.request"
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(.+)")
+
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure_import(module):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [PACKAGE_PARENT, env.get("PYTHONPATH")]))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT.format(module=module)],
+                            env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    cumulative_us = None
+    slowest = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        self_us, total_us, _, name = match.groups()
+        if name == module:
+            cumulative_us = int(total_us)
+        slowest.append((int(self_us), name))
+    slowest.sort(reverse=True)
+    return cumulative_us, result.stdout.count("SOCKET OPENED"), slowest[:5]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="LuluAPI.request")
+    parser.add_argument("--limit-ms", type=float, default=25.0)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    timings = []
+    sockets = 0
+    slowest = []
+    for _ in range(args.runs):
+        cumulative_us, opened, slowest = measure_import(args.module)
+        timings.append(cumulative_us / 1000)
+        sockets += opened
+
+    best_ms = min(timings)
+    print(f"import {args.module}: best {best_ms:.2f} ms, worst {max(timings):.2f} ms over {args.runs} runs")
+    print("slowest modules (self time, last run):")
+    for self_us, name in slowest:
+        print(f"    {self_us / 1000:7.2f} ms  {name.strip()}")
+    print(f"sockets opened during import: {sockets}")
+
+    failed = False
+    if sockets:
+        print("FAIL: the import opened a socket")
+        failed = True
+    if best_ms > args.limit_ms:
+        print(f"FAIL: the import took longer than {args.limit_ms} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
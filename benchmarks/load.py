@@ -0,0 +1,337 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Load and Soak Test
+
+Runs many simulated clients at once, each going through the same workflow as a real integration, using only the library's
+public functions:
+
+    1. calculate_print_job_cost(): a quote
+    2. retrieve_shipping_options()
+    3. create_print_job()
+    4. get_print_job_status(), --polls times, --think-time seconds apart
+    5. get_print_jobs(), one page of --page-size print-jobs
+
+Each client repeats the workflow until --duration seconds have passed (or --iterations times). A step fails if Lulu
+answers outside 2xx or the call raises. It is counted as an error, and the rest of that round of the workflow is skipped.
+Errors are reported by HTTP status ("HTTP 503"), or by exception name when there was no response.
+
+By default the clients talk to a FakeLulu (see fake_lulu.py) started in this process, which takes the --latency,
+--error-rate, --throttle-rate and --step-seconds options. --url sends them somewhere else instead, such as a fake server
+started on its own or the sandbox. Never point it at api.lulu.com: the workflow creates print-jobs. An in-process FakeLulu
+shares the process with the clients, so its CPU, threads and open connections are counted with theirs. For client-only
+numbers, run fake_lulu.py separately and pass its --url.
+
+    python -m LuluAPI.benchmarks.load [--clients 20] [--duration 60] [--latency 0.05] [--error-rate 0.01]
+    python -m LuluAPI.benchmarks.load --url http://127.0.0.1:8080/ --clients 50 --duration 3600 --sample-interval 60
+
+At the end it reports:
+
+    - For each step: calls, errors, error rate, calls per second, and p50, p95, p99 and slowest latency in milliseconds
+    - Workflows finished per second
+    - Every --sample-interval seconds: the calls finished and errors in that interval, the client's CPU use
+      (time.process_time()), its maximum resident memory (resource.getrusage(), where available), the memory allocated by
+      Python (tracemalloc, with --tracemalloc), and the number of threads and open file descriptors
+    - How much memory and open file descriptors grew from the first sample to the last. Steady growth over a long run points
+      to a leak, such as connections that are never returned to the pool.
+
+Errors include requests that failed after the retries in lulu_ratelimit.py, so throttled requests that were retried
+successfully only show up as slower calls, and in the rate limiter's "throttled" and "retries" counts.
+
+--json writes every number in the report to a file, to compare runs with each other.
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+import LuluAPI.lulu_ratelimit as ratelimit
+import LuluAPI.lulu_session as session
+import LuluAPI.request as request
+from LuluAPI.benchmarks import fixtures
+from LuluAPI.benchmarks.fake_lulu import FakeLulu
+
+STEPS = ("calculate_print_job_cost", "retrieve_shipping_options", "create_print_job", "get_print_job_status",
+         "get_print_jobs")
+
+# The status code of the last response each client thread received, set by _record_status().
+_last_status = threading.local()
+
+
+# A response hook on the shared session, so every call's HTTP status can be checked. The library returns Lulu's error
+# responses instead of raising, so without this most errors would look like successes. Retries happen in the calling
+# thread before a function returns, so the last status a thread saw is that of the response it got.
+def _record_status(response, *args, **kwargs):
+    _last_status.code = response.status_code
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.workflows = 0
+        # Calls and errors since the last sample, for the numbers over time.
+        self.interval_calls = 0
+        self.interval_errors = 0
+        self._lock = threading.Lock()
+
+    # Calls function(*args) and records how long it took under name. Returns (succeeded, result). A call fails if its
+    # response was outside 2xx (recorded as "HTTP <status>") or if it raised (recorded as the exception's name).
+    def call(self, name, function, *args):
+        _last_status.code = None
+        error = None
+        start = time.perf_counter()
+        try:
+            result = function(*args)
+        except Exception as exception:
+            result = None
+            error = type(exception).__name__
+        elapsed = time.perf_counter() - start
+        status = _last_status.code
+        # An error response often also makes the conversion after it raise, so the status is the better explanation.
+        if status is not None and not 200 <= status < 300:
+            error = f"HTTP {status}"
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            self.interval_calls += 1
+            if error is not None:
+                self.errors[name][error] += 1
+                self.interval_errors += 1
+        return error is None, result
+
+    def finish_workflow(self):
+        with self._lock:
+            self.workflows += 1
+
+    def take_interval(self):
+        with self._lock:
+            calls, errors = self.interval_calls, self.interval_errors
+            self.interval_calls = self.interval_errors = 0
+        return calls, errors
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _quote_inputs(input_info):
+    line_items = [{"pod_package_id": item["printable_normalization"]["pod_package_id"], "page_count": 212,
+                   "quantity": item["quantity"]} for item in input_info["line_items"]]
+    shipping_address = {key: value for key, value in input_info["shipping_information"].items() if key != "level"}
+    return line_items, shipping_address
+
+
+def run_client(number, recorder, deadline, args):
+    rounds = 0
+    while time.monotonic() < deadline and (args.iterations is None or rounds < args.iterations):
+        rounds += 1
+        input_info = fixtures.create_print_job_input(args.line_items)
+        input_info["external_id"] = f"load-{number}-{rounds}"
+        line_items, shipping_address = _quote_inputs(input_info)
+        level = input_info["shipping_information"]["level"]
+
+        ok, _ = recorder.call("calculate_print_job_cost", request.calculate_print_job_cost, line_items, shipping_address,
+                              level)
+        if not ok:
+            continue
+        ok, _ = recorder.call("retrieve_shipping_options", request.retrieve_shipping_options, line_items, shipping_address)
+        if not ok:
+            continue
+        ok, created = recorder.call("create_print_job", request.create_print_job, input_info)
+        if not ok:
+            continue
+        for _ in range(args.polls):
+            time.sleep(args.think_time * random.uniform(0.5, 1.5))
+            ok, _ = recorder.call("get_print_job_status", request.get_print_job_status, created["id"])
+            if not ok:
+                break
+        if not ok:
+            continue
+        ok, _ = recorder.call("get_print_jobs", request.get_print_jobs, {"page_size": args.page_size})
+        if ok:
+            recorder.finish_workflow()
+
+
+def _open_files():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def _max_rss():
+    if resource is None:
+        return None
+    # Kilobytes on Linux, bytes on macOS.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss * 1024 if os.uname().sysname != "Darwin" else max_rss
+
+
+def sample_forever(recorder, samples, stop, interval, start):
+    cpu = time.process_time()
+    wall = time.monotonic()
+    stopped = False
+    # One last sample is taken once the clients finish, so the end of the run isn't left out.
+    while not stopped:
+        stopped = stop.wait(interval)
+        now_cpu, now_wall = time.process_time(), time.monotonic()
+        calls, errors = recorder.take_interval()
+        samples.append({
+            "elapsed": now_wall - start,
+            "calls": calls,
+            "errors": errors,
+            "cpu": (now_cpu - cpu) / (now_wall - wall),
+            "max_rss": _max_rss(),
+            "python_memory": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+            "threads": threading.active_count(),
+            "open_files": _open_files(),
+        })
+        cpu, wall = now_cpu, now_wall
+
+
+def _megabytes(value):
+    return f"{value / 1048576:.1f}" if value is not None else "-"
+
+
+def report(recorder, samples, elapsed):
+    results = {"elapsed": elapsed, "workflows": recorder.workflows, "workflows_per_second": recorder.workflows / elapsed,
+               "steps": {}, "samples": samples, "ratelimit": ratelimit.stats()}
+
+    print(f"\n{'step':<28} {'calls':>8} {'errors':>7} {'error %':>8} {'calls/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'max ms':>9}")
+    for name in STEPS:
+        ordered = sorted(recorder.latencies.get(name, ()))
+        errors = sum(recorder.errors[name].values())
+        step = {
+            "calls": len(ordered),
+            "errors": errors,
+            "error_rate": errors / len(ordered) if ordered else 0.0,
+            "calls_per_second": len(ordered) / elapsed,
+            "p50": _percentile(ordered, 0.50),
+            "p95": _percentile(ordered, 0.95),
+            "p99": _percentile(ordered, 0.99),
+            "max": ordered[-1] if ordered else 0.0,
+            "error_types": dict(recorder.errors[name]),
+        }
+        results["steps"][name] = step
+        print(f"{name:<28} {step['calls']:>8} {errors:>7} {step['error_rate']:>8.2%} {step['calls_per_second']:>9.1f} "
+              f"{step['p50'] * 1000:>9.1f} {step['p95'] * 1000:>9.1f} {step['p99'] * 1000:>9.1f} {step['max'] * 1000:>9.1f}")
+        for error_type, count in recorder.errors[name].items():
+            print(f"    {error_type}: {count}")
+
+    print(f"\n{recorder.workflows} workflows in {elapsed:.1f} s: {results['workflows_per_second']:.1f} per second")
+    print(f"Rate limiter: {results['ratelimit']}")
+
+    if samples:
+        print(f"\n{'time s':>8} {'calls/s':>9} {'errors':>7} {'cpu %':>7} {'max rss MB':>11} {'python MB':>10} "
+              f"{'threads':>8} {'files':>6}")
+        previous = 0.0
+        for sample in samples:
+            print(f"{sample['elapsed']:>8.1f} {sample['calls'] / (sample['elapsed'] - previous):>9.1f} "
+                  f"{sample['errors']:>7} {sample['cpu']:>7.1%} {_megabytes(sample['max_rss']):>11} "
+                  f"{_megabytes(sample['python_memory']):>10} {sample['threads']:>8} "
+                  f"{sample['open_files'] if sample['open_files'] is not None else '-':>6}")
+            previous = sample["elapsed"]
+
+        first, last = samples[0], samples[-1]
+        growth = {key: last[key] - first[key] for key in ("max_rss", "python_memory", "open_files")
+                  if first[key] is not None and last[key] is not None}
+        results["growth"] = growth
+        if growth:
+            print("\nGrowth from the first sample to the last: " + ", ".join(
+                f"{key} {value:+}" if key == "open_files" else f"{key} {_megabytes(value)} MB"
+                for key, value in growth.items()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="The base URL to send requests to. Without it, a FakeLulu is started here.")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run for")
+    parser.add_argument("--iterations", type=int, default=None, help="Stop each client after this many workflows")
+    parser.add_argument("--ramp-up", type=float, default=0, help="Seconds over which the clients are started")
+    parser.add_argument("--polls", type=int, default=3)
+    parser.add_argument("--think-time", type=float, default=0.1, help="Seconds between status polls, give or take half")
+    parser.add_argument("--line-items", type=int, default=1)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--sample-interval", type=float, default=5)
+    parser.add_argument("--tracemalloc", action="store_true", help="Also sample memory allocated by Python (slower)")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    parser.add_argument("--latency", type=float, default=0.02, help="FakeLulu only")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="FakeLulu only")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="FakeLulu only")
+    parser.add_argument("--step-seconds", type=float, default=5.0, help="FakeLulu only")
+    parser.add_argument("--jobs", type=int, default=200, help="FakeLulu only: print-jobs to start with")
+    args = parser.parse_args()
+
+    server = None
+    if args.url is None:
+        server = FakeLulu(latency=args.latency, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                          step_seconds=args.step_seconds, jobs=args.jobs).start()
+        request.set_url_prefix(server.url)
+    else:
+        request.set_url_prefix(args.url)
+    # One kept-alive connection per client, so the pool itself doesn't become the limit being measured.
+    session.configure(pool_maxsize=max(10, args.clients))
+    hooks = session.get_session().hooks["response"]
+    hooks.append(_record_status)
+    try:
+        run_load(args, server)
+    finally:
+        hooks.remove(_record_status)
+
+
+# Runs the clients, prints the report and writes the results, with the status hook in place.
+def run_load(args, server):
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    recorder = Recorder()
+    samples = []
+    stop = threading.Event()
+    start = time.monotonic()
+    deadline = start + args.duration
+    sampler = threading.Thread(target=sample_forever, args=(recorder, samples, stop, args.sample_interval, start),
+                               daemon=True)
+    sampler.start()
+
+    print(f"{args.clients} clients against {request.URLPREFIX} for {args.duration:g} s")
+    clients = []
+    for number in range(args.clients):
+        thread = threading.Thread(target=run_client, args=(number, recorder, deadline, args), daemon=True)
+        thread.start()
+        clients.append(thread)
+        if args.ramp_up:
+            time.sleep(args.ramp_up / args.clients)
+    for thread in clients:
+        thread.join()
+    elapsed = time.monotonic() - start
+    stop.set()
+    sampler.join()
+
+    results = report(recorder, samples, elapsed)
+    if server is not None:
+        results["server"] = server.stats()
+        print(f"Fake server: {results['server']}")
+        server.stop()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as results_file:
+            json.dump(results, results_file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
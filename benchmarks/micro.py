@@ -0,0 +1,196 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Microbenchmarks
+
+Times the pure-Python work the library does around each request, on the recorded payloads in fixtures/, with no network:
+
+    - convert_print_job() on one print-job with 1, 10 and 50 line items
+    - get_print_jobs() on a page of 1, 100 and 1,000 print-jobs, and 100 print-jobs with 50 line items each. This covers
+      decoding the response and converting every print-job.
+    - create_print_job() with 1, 10 and 50 line items. This covers building and encoding the request body, decoding the
+      response, and reshaping it with convert_created_print_job().
+    - calculate_print_job_cost() with 1, 10 and 50 line items, which is mostly building and encoding the request body
+
+The request itself is replaced by the recorded response, so only the library's own work is timed. Each case is run for
+--repeat rounds of enough calls to last about --min-time seconds, with garbage collection paused as in timeit. The rounds
+take turns between the cases, so a machine that speeds up or slows down during the run affects every case alike. The median
+and fastest rounds are reported as the time per call, along with the peak memory allocated during one call.
+
+    python -m LuluAPI.benchmarks.micro [--filter get_print_jobs] [--repeat 9] [--min-time 0.2]
+    python -m LuluAPI.benchmarks.micro --save baseline.json
+    python -m LuluAPI.benchmarks.micro --compare baseline.json [--threshold 0.2] [--min-delta-time 0.000002] [--min-delta-memory 1024]
+
+--save writes the results to a JSON file. --compare checks each case's median time and peak memory against the same case
+in that file. A case only counts as a regression if it got worse by more than --threshold (0.2 is 20%) and also by more
+than --min-delta-time seconds per call or --min-delta-memory bytes, so that noise on the fastest cases isn't reported.
+The script exits with status 1 if any case regressed. Timings depend on the machine, so save the baseline on the same
+machine you compare on, before the change being measured.
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+import LuluAPI.lulu_codec as codec
+import LuluAPI.request as request
+from LuluAPI.benchmarks import fixtures
+
+
+class _RecordedResponse:
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+
+# Makes request._send() answer every request with body instead of sending it, for as long as the case runs.
+class _Replay:
+    def __init__(self, body):
+        self.response = _RecordedResponse(body)
+
+    def __enter__(self):
+        self._send = request._send
+        request._send = lambda method, url, headers, **kwargs: self.response
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        request._send = self._send
+
+
+def _replaying(body):
+    return contextlib.nullcontext() if body is None else _Replay(body)
+
+
+def _cost_response(line_items):
+    return fixtures.print_job(1, line_items)["costs"]
+
+
+def cases():
+    for line_items in (1, 10, 50):
+        job = fixtures.print_job(1, line_items)
+        yield f"convert_print_job[line_items={line_items}]", None, lambda job=job: request.convert_print_job(job)
+
+    for jobs, line_items in ((1, 1), (100, 1), (1000, 1), (100, 50)):
+        body = codec.dumps(fixtures.print_jobs_page(jobs, line_items))
+        yield f"get_print_jobs[jobs={jobs},line_items={line_items}]", body, request.get_print_jobs
+
+    for line_items in (1, 10, 50):
+        body = codec.dumps(fixtures.created_print_job(1, line_items))
+        input_info = fixtures.create_print_job_input(line_items)
+        # create_print_job() adds to input_info["shipping_information"], so each call gets a fresh copy of that part.
+        yield (f"create_print_job[line_items={line_items}]", body,
+               lambda input_info=input_info: request.create_print_job(
+                   {**input_info, "shipping_information": dict(input_info["shipping_information"])}))
+
+    for line_items in (1, 10, 50):
+        body = codec.dumps(_cost_response(line_items))
+        input_info = fixtures.create_print_job_input(line_items)
+        line_item_list = [{"pod_package_id": item["printable_normalization"]["pod_package_id"], "page_count": 212,
+                           "quantity": item["quantity"]} for item in input_info["line_items"]]
+        shipping_address = {key: value for key, value in input_info["shipping_information"].items() if key != "level"}
+        yield (f"calculate_print_job_cost[line_items={line_items}]", body,
+               lambda line_item_list=line_item_list, shipping_address=shipping_address:
+                   request.calculate_print_job_cost(line_item_list, shipping_address, "GROUND"))
+
+
+def _run(function, number):
+    # A collection can land in any round, so it is paused while timing, as timeit does.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        return time.perf_counter() - start
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def measure(selected_cases, repeat, min_time):
+    # Enough calls per round to last min_time, so the timer's resolution and the loop itself don't matter.
+    numbers = {}
+    for name, body, function in selected_cases:
+        number = 1
+        with _replaying(body):
+            while _run(function, number) < min_time:
+                number *= 2
+        numbers[name] = number
+
+    # The machine's speed can drift for seconds at a time. Running one round of each case in turn, instead of every round
+    # of one case before the next, spreads the drift over all the rounds of every case, where the median leaves it out.
+    rounds = {name: [] for name, _, _ in selected_cases}
+    for _ in range(repeat):
+        for name, body, function in selected_cases:
+            with _replaying(body):
+                rounds[name].append(_run(function, numbers[name]) / numbers[name])
+
+    results = {}
+    for name, body, function in selected_cases:
+        with _replaying(body):
+            tracemalloc.start()
+            function()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        times = sorted(rounds[name])
+        results[name] = {"time": times[0], "median": times[len(times) // 2], "peak_memory": peak}
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_time, min_delta_memory):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        # Baselines saved before medians were recorded only have the fastest round.
+        metrics = (("median", before.get("median", before["time"]), min_delta_time),
+                   ("peak_memory", before["peak_memory"], min_delta_memory))
+        for metric, previous, min_delta in metrics:
+            change = result[metric] / previous - 1 if previous else 0.0
+            flag = ""
+            if change > threshold and result[metric] - previous > min_delta:
+                flag = "  REGRESSION"
+                regressions.append(name)
+            print(f"{name:<48} {metric:<12} {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="Only run the cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=9)
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare the results against this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--min-delta-time", type=float, default=0.000002)
+    parser.add_argument("--min-delta-memory", type=int, default=1024)
+    args = parser.parse_args()
+
+    results = measure([case for case in cases() if args.filter in case[0]], args.repeat, args.min_time)
+    for name, result in results.items():
+        print(f"{name:<48} {result['median'] * 1000000:12.1f} us   best {result['time'] * 1000000:12.1f} us   "
+              f"peak {result['peak_memory'] / 1024:9.1f} KiB")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as baseline_file:
+            json.dump(results, baseline_file, indent=4)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        print()
+        regressions = compare(results, baseline, args.threshold, args.min_delta_time, args.min_delta_memory)
+        if regressions:
+            print(f"\n{len(set(regressions))} case(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Session Latency Benchmark
+
+Measures the per-call latency of a fresh connection for every request (requests.request(), which request.py used to call)
+against the kept-alive connection pool in lulu_session.py. The calls go to a small local HTTP server standing in for Lulu,
+so the numbers only show connection setup cost. Against api.lulu.com the difference is larger, since every new connection
+also pays for a TLS handshake.
+
+    python -m LuluAPI.benchmarks.session_latency [--calls 500]
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import LuluAPI.lulu_session as session
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 is required for the server to keep connections open between requests.
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, so Nagle's algorithm would otherwise add a delayed-ACK stall to every
+    # response on a kept-alive connection.
+    disable_nagle_algorithm = True
+    body = json.dumps({"name": "CREATED", "message": "", "changed": "2024-01-01T00:00:00Z"}).encode()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def time_calls(send, url, calls):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        send("GET", url).json()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<28} mean {statistics.mean(latencies) * 1000:7.3f} ms   "
+          f"p50 {statistics.median(latencies) * 1000:7.3f} ms   p99 {p99 * 1000:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+
+    server = start_server()
+    url = f"http://127.0.0.1:{server.server_address[1]}/print-jobs/1/status/"
+    try:
+        # Warm up both paths so that imports and the first connection are not counted.
+        requests.request("GET", url)
+        session.request("GET", url)
+
+        report("new connection per call", time_calls(requests.request, url, args.calls))
+        report("pooled keep-alive session", time_calls(session.request, url, args.calls))
+    finally:
+        session.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Print-Job View Benchmark
+
+Compares converting a page of print-jobs with convert_print_job() (what get_print_jobs() does by default) against wrapping
+them in lazy PrintJob views (get_print_jobs(lazy=True)). For each approach it reports the CPU time and the memory allocated
+to convert a page, and the same again when every job's id and first line item status are read afterwards.
+
+    python -m LuluAPI.benchmarks.views [--jobs 1000] [--line-items 1] [--repeat 20]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import LuluAPI.request as request
+from LuluAPI.benchmarks import fixtures
+from LuluAPI.lulu_views import PrintJob
+
+
+def eager(results):
+    return [request.convert_print_job(item) for item in results]
+
+
+def lazy(results):
+    return [PrintJob(item) for item in results]
+
+
+def read_id_and_status(jobs):
+    for job in jobs:
+        job["id"]
+        job["line_items"][0]["status"]
+    return jobs
+
+
+def best_cpu_time(function, results, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        function(results)
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def allocated(function, results):
+    tracemalloc.start()
+    kept = function(results)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--line-items", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = fixtures.print_jobs_page(args.jobs, args.line_items)["results"]
+
+    # The views must give exactly what convert_print_job() gives, or the comparison means nothing.
+    for item in results[:10]:
+        assert PrintJob(item) == request.convert_print_job(item)
+        assert PrintJob(item).to_dict() == request.convert_print_job(item)
+
+    cases = [
+        ("convert_print_job", eager),
+        ("PrintJob view", lazy),
+        ("convert_print_job + read", lambda page: read_id_and_status(eager(page))),
+        ("PrintJob view + read", lambda page: read_id_and_status(lazy(page))),
+    ]
+    print(f"{args.jobs} print-jobs with {args.line_items} line item(s) each")
+    for name, function in cases:
+        cpu = best_cpu_time(function, results, args.repeat)
+        kept, peak = allocated(function, results)
+        print(f"{name:<28} cpu {cpu * 1000:8.2f} ms   kept {kept / 1024:9.1f} KiB   peak {peak / 1024:9.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Async Request Handler
+
+An asyncio version of request.py, built on aiohttp. Every function in request.py that talks to Lulu has a coroutine with the
+same name, the same parameters and the same return value on AsyncLuluClient, including the simple versions (get_print_jobs,
+create_print_job, get_single_print_job). The documentation in request.py applies to both.
+
+All calls made through one client share a single connection pool, and at most max_concurrency requests are in flight at
+once. Calls beyond that wait their turn on the event loop instead of occupying a thread each. Requests are also paced and
+retried by lulu_ratelimit.py, sharing its limits with request.py: a 429 is retried after the wait Lulu asks for, and fewer
+requests are sent at once while Lulu is throttling.
+
+    async with AsyncLuluClient(max_concurrency=200) as client:
+        jobs = await asyncio.gather(*(client.get_single_print_job(id) for id in ids))
+
+AsyncLuluClient(url_prefix=None, max_concurrency=100, limit=100, limit_per_host=0, keepalive_timeout=15):
+    url_prefix: (string) The Lulu API address. Defaults to request.URLPREFIX, which follows the SANDBOX setting.
+    max_concurrency: (integer) The maximum number of requests in flight at once from this client
+    limit: (integer) The maximum number of open connections in the pool, 0 for no limit
+    limit_per_host: (integer) The maximum number of open connections to a single host, 0 for no limit
+    keepalive_timeout: (number) Seconds an idle connection is kept open for reuse
+
+    close(): Closes the connection pool. Using the client as an async context manager does this automatically.
+
+The client uses the same token cache as request.py. When the token needs refreshing, one task fetches it while other tasks
+wait for it, and a 401 response triggers one refresh and one replay of the request, just as in request.py.
+"""
+
+import asyncio
+
+import aiohttp
+
+import LuluAPI.lulu_codec as codec
+import LuluAPI.lulu_ratelimit as ratelimit
+import LuluAPI.lulu_token as token
+import LuluAPI.request as request
+
+
+class AsyncLuluClient:
+    def __init__(self, url_prefix=None, max_concurrency=100, limit=100, limit_per_host=0, keepalive_timeout=15):
+        self.url_prefix = url_prefix or request.URLPREFIX
+        self.max_concurrency = max_concurrency
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._token_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        # The session is created on first use so that the client can be built outside of a running event loop.
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _get_token(self):
+        auth_key = token.token_manager.cached()
+        if auth_key is not None:
+            return auth_key
+        async with self._token_lock:
+            # Another task may have refreshed the token while this one was waiting for the lock.
+            auth_key = token.token_manager.cached()
+            if auth_key is None:
+                # Fetching a token is a blocking request, so it runs in a thread to keep the event loop free.
+                auth_key = await asyncio.get_running_loop().run_in_executor(None, token.get_token)
+            return auth_key
+
+    async def _request(self, method, url, headers, data=None, params=None):
+        response = await ratelimit.send_async(method, url, lambda: self._send_authorized(method, url, headers, data, params))
+        return response.body
+
+    # Sends a request with the current token, replaying it once with a new token if Lulu rejects the old one.
+    async def _send_authorized(self, method, url, headers, data, params):
+        async with self._semaphore:
+            session = self._get_session()
+            auth_key = await self._get_token()
+            response = await self._send_once(session, method, url, headers, auth_key, data, params)
+            if response.status_code == 401:
+                token.invalidate_token(auth_key)
+                auth_key = await self._get_token()
+                response = await self._send_once(session, method, url, headers, auth_key, data, params)
+        return response
+
+    async def _send_once(self, session, method, url, headers, auth_key, data, params):
+        async with session.request(method, url, headers={**headers, "Authorization": f"Bearer {auth_key}"},
+                                   data=data, params=params) as response:
+            return _Response(response.status, response.headers, await response.read())
+
+    async def _get(self, path, params=None):
+        return codec.loads(await self._request("GET", f"{self.url_prefix}{path}", request.get_headers,
+                                              params=_query_params(params)))
+
+    async def _post(self, path, payload, method="POST"):
+        return codec.loads(await self._request(method, f"{self.url_prefix}{path}", request.post_headers,
+                                              data=codec.dumps(payload)))
+
+    async def _get_body(self, method, path):
+        return codec.loads(await self._request(method, f"{self.url_prefix}{path}", request.get_headers))
+
+    async def post_interior_file_validation(self, link, pod_package_id=""):
+        return await self._post("validate-interior/", {
+            "source_url": link,
+            "pod_package_id": pod_package_id
+        })
+
+    async def get_interior_file_validation(self, id):
+        return await self._get(f"validate-interior/{id}")
+
+    async def post_cover_file_validation(self, link, pod_package_id, interior_page_count):
+        return await self._post("validate-cover/", {
+            "source_url": link,
+            "pod_package_id": pod_package_id,
+            "interior_page_count": interior_page_count
+        })
+
+    async def get_cover_file_validation(self, id):
+        return await self._get(f"validate-cover/{id}")
+
+    async def calculate_print_job_cost(self, line_items, shipping_address, shipping_option):
+        return await self._post("print-job-cost-calculations/", {
+            "line_items": line_items,
+            "shipping_address": shipping_address,
+            "shipping_option": shipping_option
+        })
+
+    async def get_print_jobs(self, filters=None):
+        lulu_response = await self.lulu_get_print_jobs(filters)
+        for index, item in enumerate(lulu_response["results"]):
+            lulu_response["results"][index] = request.convert_print_job(item)
+        return lulu_response
+
+    async def lulu_get_print_jobs(self, filters=None):
+        return await self._get("print-jobs/", filters)
+
+    async def create_print_job(self, input_info):
+        lulu_dictionary = await self.lulu_create_print_job(input_info["line_items"], input_info["shipping_information"], input_info["shipping_information"]["level"], input_info["shipping_information"]["email"], input_info["external_id"], input_info["production_delay"])
+        return request.convert_created_print_job(input_info, lulu_dictionary)
+
+    async def lulu_create_print_job(self, line_items, shipping_address, shipping_level, contact_email, external_id="", production_delay=60):
+        return await self._post("print-jobs/", {
+            "line_items": line_items,
+            "shipping_address": shipping_address,
+            "shipping_level": shipping_level,
+            "contact_email": contact_email,
+            "external_id": external_id,
+            "production_delay": production_delay
+        })
+
+    async def get_print_job_statistics(self, filters=None):
+        return await self._get("print-jobs/statistics/", filters)
+
+    async def get_print_job_statistics_by_status(self, statuses=None, filters=None):
+        statuses = list(statuses or request.PRINT_JOB_STATUSES)
+        filters = dict(filters or {})
+        responses = await asyncio.gather(
+            *(self.get_print_job_statistics({**filters, "status": status}) for status in statuses))
+        return {status: response.get("count") for status, response in zip(statuses, responses)}
+
+    async def get_single_print_job(self, id):
+        lulu_dictionary = await self.lulu_get_single_print_job(id)
+        return request.convert_print_job(lulu_dictionary)
+
+    async def lulu_get_single_print_job(self, id):
+        return await self._get(f"print-jobs/{id}/")
+
+    async def get_print_job_cost(self, id):
+        return await self._get(f"print-jobs/{id}/costs/")
+
+    async def get_print_job_status(self, id):
+        return await self._get(f"print-jobs/{id}/status/")
+
+    async def cancel_print_job(self, id):
+        return await self._post(f"print-jobs/{id}/status/", {
+            "name": "CANCELED"
+        }, method="PUT")
+
+    async def retrieve_shipping_options(self, line_items, shipping_address, currency="USD"):
+        return await self._post("shipping-options/", {
+            "line_items": line_items,
+            "shipping_address": shipping_address,
+            "currency": currency
+        })
+
+    async def subscribe_to_webhooks(self, topics, destination_url):
+        return await self._post("webhooks/", {
+            "topics": topics,
+            "url": destination_url
+        })
+
+    async def get_webhooks(self):
+        return await self._get("webhooks/")
+
+    async def get_single_webhook(self, id):
+        return await self._get(f"webhooks/{id}/")
+
+    async def update_webhook(self, id, topics=None, destination_url=None, is_active=None):
+        payload = {}
+        if topics is not None:
+            payload["topics"] = topics
+        if destination_url is not None:
+            payload["url"] = destination_url
+        if is_active is not None:
+            payload["is_active"] = is_active
+        return await self._post(f"webhooks/{id}/", payload, method="PATCH")
+
+    async def delete_webhook(self, id):
+        return await self._get_body("DELETE", f"webhooks/{id}/")
+
+    async def test_webhook(self, id, topic):
+        try:
+            return await self._get_body("POST", f"webhooks/{id}/test-submission/{topic}")
+        except ValueError:
+            return None
+
+    async def get_webhook_submissions(self, page=1, page_size=100, created_after=None, created_before=None, is_success=None, response_code=None, webhook_id=None):
+        # Lulu reads these filters from a JSON body on a GET request, the same as request.get_webhook_submissions().
+        payload = codec.dumps({
+            "page": page,
+            "page_size": page_size,
+            "created_after": created_after,
+            "created_before": created_before,
+            "is_success": is_success,
+            "response_code": response_code,
+            "webhook_id": webhook_id
+        })
+        return codec.loads(await self._request("GET", f"{self.url_prefix}webhook-submissions/", request.get_headers,
+                                              data=payload))
+
+
+# The parts of an aiohttp response that lulu_ratelimit.py reads, kept after the connection is released.
+class _Response:
+    def __init__(self, status_code, headers, body):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+
+# aiohttp only accepts strings and numbers as query values. requests drops None values and sends everything else as
+# str(value), so the same is done here to send identical queries.
+def _query_params(filters):
+    if not filters:
+        return None
+    return {key: str(value) for key, value in filters.items() if value is not None}
@@ -0,0 +1,207 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Quote Cache
+
+Remembers the answers to calculate_print_job_cost() and retrieve_shipping_options() for a short time, so the same quote
+asked for again (for example on every render of a shopping cart) is answered from memory instead of a request to Lulu. Two
+requests count as the same when their line items, shipping address and shipping option or currency are the same, whatever
+order the dictionary keys are in.
+
+calculate_print_job_cost(line_items, shipping_address, shipping_option): Identical to request.calculate_print_job_cost(), but cached.
+
+retrieve_shipping_options(line_items, shipping_address, currency="USD"): Identical to request.retrieve_shipping_options(), but cached.
+
+get_print_job_statistics_by_status(statuses=None, filters=None): Identical to request.get_print_job_statistics_by_status(),
+but cached for statistics_ttl seconds. Calls made together while the counts are being fetched (a dashboard refreshed by
+many viewers at once) wait for that one fetch instead of each asking Lulu.
+
+configure(ttl=300, max_entries=10000, statistics_ttl=10): Replaces the quote and statistics caches with empty ones with new settings.
+    ttl: (number) Seconds a quote is kept before Lulu is asked again
+    max_entries: (integer) Once the cache holds this many quotes, the least recently used one is removed to make space
+    statistics_ttl: (number) Seconds print-job statistics are kept before Lulu is asked again
+
+stats(): Returns a dictionary with the "hits", "misses", "size" and "hit_rate" of the quote cache.
+
+Responses that don't contain a quote (an error message, for example) are never cached. The returned dictionaries are
+shared between callers, so copy one before changing it.
+
+TTLCache(ttl, max_entries): The cache the quotes are stored in, which can be used for anything else that needs one.
+    get(key, default=None): Returns the value for key, or default if it is missing or older than ttl
+    set(key, value): Stores value under key
+    get_or_set(key, function): Returns the value for key, calling function() and storing its result when it is missing
+    pop(key, default=None): Removes key and returns its value
+    clear(): Removes everything
+    stats(): Returns a dictionary with the "hits", "misses", "size" and "hit_rate"
+
+canonical_key(*parts): Returns a hashable key built from dictionaries and lists, that is the same regardless of dictionary key order.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import LuluAPI.request as request
+
+_MISSING = object()
+
+
+def canonical_key(*parts):
+    return tuple(_freeze(part) for part in parts)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class TTLCache:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Each value is (expiry time, value). The order of the OrderedDict is the order of last use, oldest first.
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key, function):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = function()
+            self.set(key, value)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+quote_cache = TTLCache(ttl=300, max_entries=10000)
+# Statistics change all the time, so they are only kept long enough to share one fetch between dashboards refreshed together.
+statistics_cache = TTLCache(ttl=10, max_entries=1000)
+
+# The fetch in progress for each key, as a Future the other callers for that key wait on.
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def configure(ttl=300, max_entries=10000, statistics_ttl=10):
+    global quote_cache, statistics_cache
+    quote_cache = TTLCache(ttl=ttl, max_entries=max_entries)
+    statistics_cache = TTLCache(ttl=statistics_ttl, max_entries=1000)
+
+
+def stats():
+    return quote_cache.stats()
+
+
+def _cached_quote(key, function, is_quote):
+    cache = quote_cache
+    response = cache.get(key, _MISSING)
+    if response is _MISSING:
+        response = function()
+        # Errors are not cached, so a fixed address or a Lulu outage is seen on the next call.
+        if is_quote(response):
+            cache.set(key, response)
+    return response
+
+
+# Calls function() once for all the callers asking for key at the same time, and gives each of them its result.
+def _single_flight(key, function):
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        first = future is None
+        if first:
+            future = Future()
+            _in_flight[key] = future
+    if not first:
+        return future.result()
+    try:
+        result = function()
+        future.set_result(result)
+        return result
+    except Exception as error:
+        future.set_exception(error)
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+
+
+def _is_cost(response):
+    return isinstance(response, dict) and "line_item_costs" in response
+
+
+# Lulu answers with a list of shipping options, or a single option when only one is possible.
+def _is_shipping_options(response):
+    return isinstance(response, list) or (isinstance(response, dict) and "level" in response)
+
+
+def calculate_print_job_cost(line_items, shipping_address, shipping_option):
+    key = canonical_key("cost", line_items, shipping_address, shipping_option)
+    return _cached_quote(key, lambda: request.calculate_print_job_cost(line_items, shipping_address, shipping_option),
+                         _is_cost)
+
+
+def retrieve_shipping_options(line_items, shipping_address, currency="USD"):
+    key = canonical_key("shipping", line_items, shipping_address, currency)
+    return _cached_quote(key, lambda: request.retrieve_shipping_options(line_items, shipping_address, currency),
+                         _is_shipping_options)
+
+
+def get_print_job_statistics_by_status(statuses=None, filters=None):
+    cache = statistics_cache
+    key = canonical_key("statistics", sorted(statuses or request.PRINT_JOB_STATUSES), filters or {})
+    counts = cache.get(key, _MISSING)
+    if counts is not _MISSING:
+        return counts
+
+    def fetch():
+        counts = request.get_print_job_statistics_by_status(statuses, filters)
+        # A status Lulu couldn't count is asked again next time, instead of being remembered as missing.
+        if None not in counts.values():
+            cache.set(key, counts)
+        return counts
+
+    return _single_flight(key, fetch)
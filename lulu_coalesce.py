@@ -0,0 +1,132 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Quote Coalescing
+
+calculate_print_job_cost() accepts many line items at once and prices each one separately in "line_item_costs". A
+QuoteCoalescer takes advantage of that: single-item quotes asked for by different threads at nearly the same time, for the
+same shipping address and shipping option, are gathered for a short window and sent to Lulu as one request. Each caller
+then gets back the cost of its own line item. At busy times this sends far fewer requests than quoting one item at a time.
+
+    coalescer = QuoteCoalescer(window=0.05)
+    line_item_cost = coalescer.quote({"pod_package_id": ..., "page_count": 32, "quantity": 1}, shipping_address, "MAIL")
+
+QuoteCoalescer(window=0.05, max_items=25):
+    window: (number) Seconds to wait for more quotes after the first one arrives, before sending them together
+    max_items: (integer) A batch is sent straight away once it has this many line items
+
+    quote(line_item, shipping_address, shipping_option, timeout=None): Returns the cost of line_item, waiting for the batch it is sent in
+        line_item: (dictionary) A single line item, identical to one entry of line_items in calculate_print_job_cost()
+        shipping_address: (dictionary) Identical to calculate_print_job_cost()
+        shipping_option: (string) Identical to calculate_print_job_cost()
+        timeout: (number) Seconds to wait before giving up with a TimeoutError. None waits forever.
+
+        The returned dictionary is the line item's entry in "line_item_costs" (see calculate_print_job_cost()), with one addition:
+        {
+            currency: (string) The currency of the costs
+        }
+        If Lulu rejects the quote, the full error response from calculate_print_job_cost() is returned instead.
+
+    submit(line_item, shipping_address, shipping_option): The same as quote(), but returns a Future instead of waiting. Cancelling
+        the Future before its batch is sent leaves the item out of the request.
+
+    flush(): Sends every waiting batch straight away.
+
+    stats(): Returns a dictionary with the number of "items" quoted and "requests" sent to Lulu.
+
+If a batch is rejected as a whole (one bad line item makes Lulu reject the request), its line items are quoted again one at a
+time, so a bad line item only affects its own caller.
+"""
+
+import threading
+from concurrent.futures import Future
+
+import LuluAPI.request as request
+from LuluAPI.lulu_cache import canonical_key
+
+
+class QuoteCoalescer:
+    def __init__(self, window=0.05, max_items=25):
+        self.window = window
+        self.max_items = max_items
+        self.items = 0
+        self.requests = 0
+        # Each batch waiting to be sent, by shipping address and option: (shipping_address, shipping_option, [(line_item, future)])
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def quote(self, line_item, shipping_address, shipping_option, timeout=None):
+        return self.submit(line_item, shipping_address, shipping_option).result(timeout=timeout)
+
+    def submit(self, line_item, shipping_address, shipping_option):
+        future = Future()
+        key = canonical_key(shipping_address, shipping_option)
+        with self._lock:
+            self.items += 1
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = (shipping_address, shipping_option, [])
+                self._batches[key] = batch
+                timer = threading.Timer(self.window, self._send, (key, batch))
+                timer.daemon = True
+                timer.start()
+            batch[2].append((line_item, future))
+            full = len(batch[2]) >= self.max_items
+        if full:
+            self._send(key, batch)
+        return future
+
+    def flush(self):
+        with self._lock:
+            batches = list(self._batches.items())
+        for key, batch in batches:
+            self._send(key, batch)
+
+    def stats(self):
+        return {"items": self.items, "requests": self.requests}
+
+    def _send(self, key, batch):
+        with self._lock:
+            # The batch may already have been sent by flush(), or because it filled up before its timer ran out.
+            if self._batches.get(key) is not batch:
+                return
+            del self._batches[key]
+        shipping_address, shipping_option, entries = batch
+        # Items whose future was cancelled are left out. The rest can't be cancelled from here on, so setting their results
+        # can't fail, and an error is only ever one from the request itself.
+        entries = [(line_item, future) for line_item, future in entries if future.set_running_or_notify_cancel()]
+        if not entries:
+            return
+        try:
+            response = self._calculate([line_item for line_item, _ in entries], shipping_address, shipping_option)
+            line_item_costs = response.get("line_item_costs")
+            if line_item_costs is None or len(line_item_costs) != len(entries):
+                if len(entries) > 1:
+                    for line_item, future in entries:
+                        self._send_alone(line_item, future, shipping_address, shipping_option)
+                    return
+                for _, future in entries:
+                    future.set_result(response)
+                return
+            for (_, future), line_item_cost in zip(entries, line_item_costs):
+                future.set_result({**line_item_cost, "currency": response.get("currency")})
+        except Exception as error:
+            for _, future in entries:
+                if not future.done():
+                    future.set_exception(error)
+
+    def _send_alone(self, line_item, future, shipping_address, shipping_option):
+        try:
+            response = self._calculate([line_item], shipping_address, shipping_option)
+        except Exception as error:
+            future.set_exception(error)
+            return
+        if response.get("line_item_costs"):
+            future.set_result({**response["line_item_costs"][0], "currency": response.get("currency")})
+        else:
+            future.set_result(response)
+
+    def _calculate(self, line_items, shipping_address, shipping_option):
+        with self._lock:
+            self.requests += 1
+        return request.calculate_print_job_cost(line_items, shipping_address, shipping_option)
@@ -0,0 +1,100 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- JSON Codec
+
+The JSON encoder and decoder used for every request body and response in request.py and lulu_async.py. The fastest
+installed library is used: orjson, then ujson, then Python's own json module. orjson encodes straight to bytes. The
+others encode to a string that is then turned into UTF-8 bytes.
+
+The codec is picked on the first call to dumps() or loads() rather than at import, because importing orjson takes longer
+than importing the rest of the library.
+
+dumps(obj): Returns obj encoded as compact JSON bytes, ready to be sent as a request body.
+
+loads(data): Returns the Python object decoded from data, which can be bytes or a string. Raises a ValueError if data is not JSON.
+
+set_codec(name): Switches every later dumps() and loads() to the named codec. Raises ImportError if it is not installed.
+    name: (string) "orjson", "ujson" or "json"
+
+available_codecs(): Returns a dictionary of each installed codec name to its (dumps, loads) pair of functions, fastest first.
+
+CODEC: (string) The name of the codec in use, or None before the first call.
+"""
+
+import json
+
+
+def _load_orjson():
+    import orjson
+    return (
+        # OPT_NON_STR_KEYS matches the json module, which turns integer dictionary keys into strings instead of failing.
+        lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS),
+        orjson.loads,
+    )
+
+
+def _load_ujson():
+    import ujson
+    return (
+        lambda obj: ujson.dumps(obj, ensure_ascii=False).encode("utf-8"),
+        ujson.loads,
+    )
+
+
+def _load_json():
+    return (
+        lambda obj: json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        json.loads,
+    )
+
+
+# Fastest first.
+_LOADERS = {
+    "orjson": _load_orjson,
+    "ujson": _load_ujson,
+    "json": _load_json,
+}
+
+CODEC = None
+_dumps = None
+_loads = None
+
+
+def set_codec(name):
+    global CODEC, _dumps, _loads
+    if name not in _LOADERS:
+        raise ValueError(f"Unknown JSON codec {name!r}, expected one of {list(_LOADERS)}")
+    _dumps, _loads = _LOADERS[name]()
+    CODEC = name
+
+
+def available_codecs():
+    codecs = {}
+    for name, loader in _LOADERS.items():
+        try:
+            codecs[name] = loader()
+        except ImportError:
+            pass
+    return codecs
+
+
+def _set_fastest_codec():
+    for name in _LOADERS:
+        try:
+            set_codec(name)
+            return
+        except ImportError:
+            pass
+
+
+def dumps(obj):
+    if _dumps is None:
+        _set_fastest_codec()
+    return _dumps(obj)
+
+
+def loads(data):
+    if _loads is None:
+        _set_fastest_codec()
+    return _loads(data)
@@ -0,0 +1,150 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Columnar Print-Jobs
+
+Turns many print-jobs into columns (one array per field) for reporting, instead of one dictionary per print-job. Numbers
+are stored as integers: costs in cents and dates in seconds since 1970 (UTC). If NumPy is installed the columns are NumPy
+arrays and the aggregations below run as NumPy operations. Otherwise the numeric columns are array.array("q") and the
+text columns are lists, and the same functions work in plain Python.
+
+to_columns(print_jobs, use_numpy=None): Returns a dictionary of columns, one entry per print-job in each column
+    print_jobs: (iterable of dictionaries) Print-jobs exactly as Lulu sends them, for example the "results" of lulu_get_print_jobs()
+                or iter_print_jobs(convert=False). Simple dictionaries from convert_print_job() are not accepted.
+    use_numpy: (boolean) Force NumPy on or off. By default NumPy is used when it is installed.
+
+    The dictionary contains:
+    {
+        id: (integers) The print-job ids
+        order_id: (strings) The order ids ("" if there is none)
+        external_id: (strings) The external ids ("" if there is none)
+        status: (strings) The print-job status names
+        country_code: (strings) The shipping country codes
+        state_code: (strings) The shipping state codes ("" if there is none)
+        shipping_level: (strings) The shipping levels
+        currency: (strings) The cost currencies
+        line_item_count: (integers) The number of line items
+        quantity: (integers) The total number of books across all line items
+        total_cost_excl_tax: (integers) In cents
+        total_cost_incl_tax: (integers) In cents
+        total_tax: (integers) In cents
+        shipping_cost: (integers) The shipping cost including tax, in cents
+        fulfillment_cost: (integers) The fulfillment cost including tax, in cents
+        date_created: (integers) Seconds since 1970 (UTC)
+        date_modified: (integers) Seconds since 1970 (UTC)
+    }
+    Missing costs and dates are stored as 0.
+
+count_by(columns, key): Returns a dictionary of each value in the key column to the number of print-jobs with that value
+    count_by(columns, "status") -> {"SHIPPED": 1203, "IN_PRODUCTION": 17, ...}
+
+sum_by(columns, key, value): Returns a dictionary of each value in the key column to the sum of the value column for those print-jobs
+    sum_by(columns, "country_code", "total_cost_incl_tax") -> {"US": 2503411, "CA": 81233, ...}
+"""
+
+import array
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TEXT_COLUMNS = ("order_id", "external_id", "status", "country_code", "state_code", "shipping_level", "currency")
+INTEGER_COLUMNS = ("id", "line_item_count", "quantity", "total_cost_excl_tax", "total_cost_incl_tax", "total_tax",
+                   "shipping_cost", "fulfillment_cost", "date_created", "date_modified")
+
+
+# Lulu sends money as strings like "19.02". Most have exactly two decimals and are parsed with integer arithmetic only.
+# Anything else is rounded to the nearest cent with Decimal.
+def _cents(value):
+    if value is None or value == "":
+        return 0
+    whole, _, fraction = value.partition(".")
+    if len(fraction) <= 2 and whole.lstrip("-").isdigit() and (fraction == "" or fraction.isdigit()):
+        cents = int(whole.lstrip("-") or 0) * 100 + int(fraction.ljust(2, "0"))
+        return -cents if whole.startswith("-") else cents
+    return int((Decimal(value) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def _epoch(value):
+    if not value:
+        return 0
+    # fromisoformat() only accepts a trailing "Z" from Python 3.11 onwards.
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+def to_columns(print_jobs, use_numpy=None):
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    elif use_numpy and numpy is None:
+        raise ImportError("use_numpy=True requires NumPy to be installed")
+
+    columns = {name: [] for name in TEXT_COLUMNS + INTEGER_COLUMNS}
+    for job in print_jobs:
+        address = job.get("shipping_address") or {}
+        costs = job.get("costs") or {}
+        line_items = job.get("line_items") or []
+        columns["id"].append(job["id"])
+        columns["order_id"].append(job.get("order_id") or "")
+        columns["external_id"].append(job.get("external_id") or "")
+        columns["status"].append((job.get("status") or {}).get("name") or "")
+        columns["country_code"].append(address.get("country_code") or "")
+        columns["state_code"].append(address.get("state_code") or "")
+        columns["shipping_level"].append(job.get("shipping_level") or "")
+        columns["currency"].append(costs.get("currency") or "")
+        columns["line_item_count"].append(len(line_items))
+        columns["quantity"].append(sum(item.get("quantity") or 0 for item in line_items))
+        columns["total_cost_excl_tax"].append(_cents(costs.get("total_cost_excl_tax")))
+        columns["total_cost_incl_tax"].append(_cents(costs.get("total_cost_incl_tax")))
+        columns["total_tax"].append(_cents(costs.get("total_tax")))
+        columns["shipping_cost"].append(_cents((costs.get("shipping_cost") or {}).get("total_cost_incl_tax")))
+        columns["fulfillment_cost"].append(_cents((costs.get("fulfillment_cost") or {}).get("total_cost_incl_tax")))
+        columns["date_created"].append(_epoch(job.get("date_created")))
+        columns["date_modified"].append(_epoch(job.get("date_modified")))
+
+    for name in INTEGER_COLUMNS:
+        if use_numpy:
+            columns[name] = numpy.array(columns[name], dtype=numpy.int64)
+        else:
+            columns[name] = array.array("q", columns[name])
+    if use_numpy:
+        for name in TEXT_COLUMNS:
+            columns[name] = numpy.array(columns[name], dtype=str)
+    return columns
+
+
+def _is_numpy(column):
+    return numpy is not None and isinstance(column, numpy.ndarray)
+
+
+def count_by(columns, key):
+    keys = columns[key]
+    if _is_numpy(keys):
+        values, counts = numpy.unique(keys, return_counts=True)
+        return {value.item(): int(count) for value, count in zip(values, counts)}
+    counts = {}
+    for value in keys:
+        counts[value] = counts.get(value, 0) + 1
+    return counts
+
+
+def sum_by(columns, key, value):
+    keys = columns[key]
+    amounts = columns[value]
+    if _is_numpy(keys):
+        groups, inverse = numpy.unique(keys, return_inverse=True)
+        totals = numpy.zeros(len(groups), dtype=numpy.int64)
+        # add.at keeps the sums in exact integers, where bincount() would add them up as floats.
+        numpy.add.at(totals, inverse, amounts)
+        return {group.item(): int(total) for group, total in zip(groups, totals)}
+    totals = {}
+    for group, amount in zip(keys, amounts):
+        totals[group] = totals.get(group, 0) + amount
+    return totals
@@ -0,0 +1,160 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Webhook Event Store
+
+Lulu can send the same webhook more than once, and can send them out of order, so the latest delivery isn't always the
+latest state of a print-job. An EventStore keeps the latest state it has seen of each print-job, and sorts every new
+delivery into one of four kinds:
+
+    - A duplicate: the same print-job, modified at the same time, with the same statuses. It is dropped.
+    - Stale: modified before the state already stored. It is dropped.
+    - An update: newer than the stored state, but with the same statuses. It is stored, but isn't a transition.
+    - A transition: newer than the stored state, with a different status for the print-job or any line item. It is
+      stored and returned.
+
+Print-jobs are compared by date_modified. If either side has no date_modified, only the statuses are compared.
+
+    store = EventStore()
+    receiver = WebhookReceiver(store=store)    # The handlers only see transitions
+
+EventStore(max_jobs=10000):
+    max_jobs: (integer) The number of print-jobs to remember. Once there are more, the one updated longest ago is forgotten,
+              and a late delivery for it would be treated as new.
+
+    update(print_job, status=None): Stores print_job if it is newer than the stored state. Returns a dictionary describing the
+        transition, or None for a duplicate, stale delivery or update.
+        print_job: (dictionary) A master dictionary from convert_print_job(), a PrintJob view, or a print-job as Lulu sends it
+        status: (string) The status of the print-job, such as "PRODUCTION_READY". Master dictionaries and PrintJob views
+                don't keep it, so pass it from the print-job Lulu sent, or a change in it alone looks like an update.
+                Defaults to print_job["status"], if there is one.
+
+        The dictionary contains:
+        {
+            id: (integer) The id of the print-job
+            print_job: (dictionary) The new state, exactly as it was given to update()
+            statuses: (tuple of strings) The status of the print-job, followed by the status of each line item
+            previous: (dictionary) The state stored before, or None if the print-job hadn't been seen before
+            previous_statuses: (tuple of strings) The statuses of previous, or None
+        }
+
+    rollback(transition): Puts back the state stored before a transition returned by update(), unless a newer delivery has
+        been stored since. Use it when a transition couldn't be passed on, so the next delivery of it isn't a duplicate.
+
+    latest(id): Returns the latest stored state of the print-job, or None
+    forget(id): Forgets the print-job, for example once it is SHIPPED or CANCELED
+    stats(): Returns a dictionary with the number of "transitions", "updates", "duplicates" and "stale" deliveries seen,
+        and the number of print-jobs stored ("size").
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+def _timestamp(print_job):
+    value = print_job.get("date_modified")
+    if not value:
+        return None
+    try:
+        # fromisoformat() only understands a trailing "Z" from Python 3.11.
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+# Works for master dictionaries, where statuses are strings, and for Lulu's print-jobs, where they are {"name": ...}.
+def _status_name(status):
+    return status.get("name") if isinstance(status, dict) else status
+
+
+def _statuses(print_job, status=None):
+    if status is None:
+        status = _status_name(print_job.get("status"))
+    return (status,
+            *(_status_name(item.get("status")) for item in print_job.get("line_items") or ()))
+
+
+class EventStore:
+    def __init__(self, max_jobs=10000):
+        self.max_jobs = max_jobs
+        self.transitions = 0
+        self.updates = 0
+        self.duplicates = 0
+        self.stale = 0
+        # Each print-job id mapped to (timestamp, statuses, print_job), in order of last update, oldest first.
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __contains__(self, id):
+        return id in self._jobs
+
+    def update(self, print_job, status=None):
+        id = print_job["id"]
+        timestamp = _timestamp(print_job)
+        statuses = _statuses(print_job, status)
+        with self._lock:
+            stored = self._jobs.get(id)
+            if stored is not None:
+                stored_timestamp, stored_statuses, _ = stored
+                if timestamp is not None and stored_timestamp is not None:
+                    if timestamp < stored_timestamp:
+                        self.stale += 1
+                        return None
+                    if timestamp == stored_timestamp and statuses == stored_statuses:
+                        self.duplicates += 1
+                        return None
+                elif statuses == stored_statuses:
+                    self.duplicates += 1
+                    return None
+
+            self._jobs[id] = (timestamp, statuses, print_job)
+            self._jobs.move_to_end(id)
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+            if stored is not None and statuses == stored[1]:
+                self.updates += 1
+                return None
+            self.transitions += 1
+        return {
+            "id": id,
+            "print_job": print_job,
+            "statuses": statuses,
+            "previous": stored[2] if stored else None,
+            "previous_statuses": stored[1] if stored else None,
+        }
+
+    def rollback(self, transition):
+        id = transition["id"]
+        with self._lock:
+            stored = self._jobs.get(id)
+            if stored is None or stored[2] is not transition["print_job"]:
+                return
+            self.transitions -= 1
+            if transition["previous"] is None:
+                del self._jobs[id]
+            else:
+                previous = transition["previous"]
+                self._jobs[id] = (_timestamp(previous), transition["previous_statuses"], previous)
+
+    def latest(self, id):
+        stored = self._jobs.get(id)
+        return stored[2] if stored else None
+
+    def forget(self, id):
+        with self._lock:
+            self._jobs.pop(id, None)
+
+    def stats(self):
+        return {
+            "transitions": self.transitions,
+            "updates": self.updates,
+            "duplicates": self.duplicates,
+            "stale": self.stale,
+            "size": len(self._jobs),
+        }
@@ -0,0 +1,236 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Print-Job Mirror
+
+Keeps a copy of every print-job in a local SQLite database, so dashboards and support tools can look print-jobs up in
+milliseconds instead of asking Lulu each time. The first sync downloads every print-job (the pages in parallel, through
+fetch_all_print_jobs()). After that, each sync only asks Lulu for the print-jobs modified since the newest one already
+stored (or since the previous sync started, if that is earlier), using the modified_after filter of lulu_get_print_jobs().
+
+    mirror = PrintJobMirror("print_jobs.sqlite3", max_staleness=300)
+    unpaid = mirror.find(status="UNPAID")
+    print_job = mirror.get(12345)
+
+Every query first checks how long ago the last sync was. If it was longer ago than max_staleness, the mirror syncs before
+answering, so an answer is never more than max_staleness seconds behind Lulu.
+
+PrintJobMirror(path="lulu_mirror.sqlite3", max_staleness=300, filters=None, page_size=100, max_workers=8):
+    path: (string) The SQLite database file. ":memory:" keeps the mirror in memory for the life of the program.
+    max_staleness: (number) The most seconds a query's answer can be behind Lulu. None never syncs on its own; call sync() yourself.
+    filters: (dictionary) Only mirror the print-jobs matching these filters, identical to lulu_get_print_jobs(). For
+             example {"created_after": "2024-01-01T00:00:00Z"}.
+    page_size: (integer) The number of print-jobs asked for in each page
+    max_workers: (integer) The number of pages downloaded at once during a full sync
+
+    sync(full=False): Brings the mirror up to date, and returns a dictionary with whether it was a "full" sync, the number of
+        print-jobs "fetched", and the "elapsed" seconds. full=True downloads every print-job again.
+        If a page can't be downloaded it raises a LuluHTTPError, and if a full sync gets fewer print-jobs than Lulu
+        counted it raises an IncompleteScanError (both in request.py). Either way last_sync is left as it was, so the
+        next sync covers the same ground again.
+
+    get(id, convert=True, lazy=False): Returns the print-job with the id, or None
+    find(status=None, external_id=None, order_id=None, country_code=None, created_after=None, created_before=None,
+         limit=None, convert=True, lazy=False): Returns a list of the print-jobs matching every argument given, newest first
+        status: (string) The print-job status, such as "IN_PRODUCTION"
+        external_id: (string) The external_id of the print-job
+        order_id: (string) The order_id of the print-job
+        country_code: (string) The shipping country code, such as "US"
+        created_after: (ISO 8601 timestamp) Print-jobs created after this moment
+        created_before: (ISO 8601 timestamp) Print-jobs created before this moment
+        limit: (integer) The most print-jobs to return
+    count_by_status(): Returns a dictionary of each status to its number of print-jobs
+
+    For get() and find(), convert=True returns master dictionaries like get_single_print_job(), lazy=True returns
+    PrintJob views (see lulu_views.py), and convert=False returns print-jobs as Lulu sends them.
+
+    last_sync: (float) The time.time() of the last sync, or None if there hasn't been one
+    close(): Closes the database.
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import LuluAPI.lulu_codec as codec
+import LuluAPI.request as request
+from LuluAPI.lulu_views import PrintJob
+
+# Each incremental sync starts this many seconds before the newest date_modified already stored, or before the last sync
+# started if that is earlier. That way, print-jobs modified in the same second, but not yet visible in the last sync, aren't
+# missed. Re-storing a print-job is harmless.
+OVERLAP = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS print_jobs (
+    id INTEGER PRIMARY KEY,
+    status TEXT,
+    external_id TEXT,
+    order_id TEXT,
+    country_code TEXT,
+    date_created INTEGER,
+    date_modified INTEGER,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS print_jobs_status ON print_jobs (status);
+CREATE INDEX IF NOT EXISTS print_jobs_external_id ON print_jobs (external_id);
+CREATE INDEX IF NOT EXISTS print_jobs_order_id ON print_jobs (order_id);
+CREATE INDEX IF NOT EXISTS print_jobs_date_created ON print_jobs (date_created);
+CREATE INDEX IF NOT EXISTS print_jobs_country_code ON print_jobs (country_code);
+CREATE INDEX IF NOT EXISTS print_jobs_date_modified ON print_jobs (date_modified);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+
+def _epoch(value):
+    if not value:
+        return None
+    # fromisoformat() only accepts a trailing "Z" from Python 3.11 onwards.
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+def _iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _row(item):
+    return (
+        item["id"],
+        (item.get("status") or {}).get("name"),
+        item.get("external_id"),
+        item.get("order_id"),
+        (item.get("shipping_address") or {}).get("country_code"),
+        _epoch(item.get("date_created")),
+        _epoch(item.get("date_modified")),
+        codec.dumps(item),
+    )
+
+
+class PrintJobMirror:
+    def __init__(self, path="lulu_mirror.sqlite3", max_staleness=300, filters=None, page_size=100, max_workers=8):
+        self.path = path
+        self.max_staleness = max_staleness
+        self.filters = dict(filters or {})
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        # Held for the whole of a sync, so that queries arriving together during one wait for it instead of starting their own.
+        self._sync_lock = threading.RLock()
+        with self._lock, self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _state(self, key):
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def last_sync(self):
+        return self._state("last_sync")
+
+    def _store(self, items):
+        rows = [_row(item) for item in items]
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO print_jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def sync(self, full=False):
+        with self._sync_lock:
+            start = time.perf_counter()
+            started_at = time.time()
+            with self._lock:
+                newest = self._connection.execute("SELECT MAX(date_modified) FROM print_jobs").fetchone()[0]
+            full = full or newest is None
+
+            if full:
+                # Ordered by id, so print-jobs created during the download don't shift the others between pages. If a
+                # page fails or print-jobs are missing, fetch_all_print_jobs() raises before last_sync is recorded.
+                filters = {**self.filters, "ordering": "id"}
+                fetched = self._store(request.fetch_all_print_jobs(
+                    filters, page_size=self.page_size, max_workers=self.max_workers, convert=False)["results"])
+            else:
+                # A print-job modified during the last sync, after its page was fetched, can be older than the newest
+                # one stored. So the sync also starts no later than when the last one started.
+                last_sync = self.last_sync
+                watermark = newest if last_sync is None else min(newest, int(last_sync))
+                filters = {**self.filters, "page_size": self.page_size, "modified_after": _iso(watermark - OVERLAP)}
+                fetched = 0
+                page = []
+                for item in request.iter_print_jobs(filters, convert=False):
+                    page.append(item)
+                    if len(page) == self.page_size:
+                        fetched += self._store(page)
+                        page = []
+                fetched += self._store(page)
+
+            with self._lock, self._connection:
+                # The time the sync started, since changes made at Lulu while it ran may have been missed.
+                self._connection.execute("INSERT OR REPLACE INTO sync_state VALUES ('last_sync', ?)", (started_at,))
+            return {"full": full, "fetched": fetched, "elapsed": time.perf_counter() - start}
+
+    def _ensure_fresh(self):
+        if self.max_staleness is None:
+            return
+        last_sync = self.last_sync
+        if last_sync is None or time.time() - last_sync > self.max_staleness:
+            with self._sync_lock:
+                # Another thread may have finished a sync while this one waited for it.
+                last_sync = self.last_sync
+                if last_sync is None or time.time() - last_sync > self.max_staleness:
+                    self.sync()
+
+    def _output(self, data, convert, lazy):
+        item = codec.loads(data)
+        if lazy:
+            return PrintJob(item)
+        return request.convert_print_job(item) if convert else item
+
+    def get(self, id, convert=True, lazy=False):
+        self._ensure_fresh()
+        with self._lock:
+            row = self._connection.execute("SELECT data FROM print_jobs WHERE id = ?", (id,)).fetchone()
+        return self._output(row[0], convert, lazy) if row else None
+
+    def find(self, status=None, external_id=None, order_id=None, country_code=None, created_after=None,
+             created_before=None, limit=None, convert=True, lazy=False):
+        self._ensure_fresh()
+        conditions = []
+        parameters = []
+        for column, value in (("status", status), ("external_id", external_id), ("order_id", order_id),
+                              ("country_code", country_code)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        if created_after is not None:
+            conditions.append("date_created > ?")
+            parameters.append(_epoch(created_after))
+        if created_before is not None:
+            conditions.append("date_created < ?")
+            parameters.append(_epoch(created_before))
+        query = "SELECT data FROM print_jobs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY date_created DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+        return [self._output(row[0], convert, lazy) for row in rows]
+
+    def count_by_status(self):
+        self._ensure_fresh()
+        with self._lock:
+            return dict(self._connection.execute("SELECT status, COUNT(*) FROM print_jobs GROUP BY status"))
@@ -0,0 +1,251 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Adaptive Status Poller
+
+Follows the status of many print-jobs with get_print_job_status(), for when webhooks (see lulu_webhooks.py) can't be used.
+Instead of checking every print-job on the same timer, each one is checked as often as its status is likely to change:
+
+    - Statuses that usually pass in minutes (CREATED, PAYMENT_IN_PROGRESS) are checked every minute.
+    - Statuses that wait on a person or a printer (UNPAID, PRODUCTION_READY, IN_PRODUCTION, ERROR) are checked far less often.
+    - A PRODUCTION_DELAYED print-job isn't checked again until its production_due_time, and an IN_PRODUCTION print-job not
+      until its earliest estimated dispatch date, when Lulu has given them.
+    - SHIPPED, CANCELED and REJECTED print-jobs will never change again, and stop being checked.
+
+A single scheduler thread keeps every print-job in a priority queue ordered by when it is next due, so thousands of
+print-jobs cost one thread and one request each when they are due, and nothing in between.
+
+    poller = StatusPoller()
+
+    @poller.on_transition
+    def changed(transition):
+        print(transition["id"], transition["previous"], "->", transition["status"])
+
+    for print_job in get_print_jobs({"status": "IN_PRODUCTION"})["results"]:
+        poller.track(print_job["id"], print_job=print_job)
+
+StatusPoller(intervals=None, max_workers=8, jitter=0.1, max_interval=86400, refresh_dates=True):
+    intervals: (dictionary) Seconds between checks for each status, replacing the ones in DEFAULT_INTERVALS
+    max_workers: (integer) The number of status checks in flight at once
+    jitter: (number between 0 and 1) How much each wait is randomly lengthened or shortened, as a fraction of the wait, so
+            print-jobs tracked together aren't all checked at the same moment
+    max_interval: (number) The longest wait in seconds between two checks of one print-job, however far away its dates are
+    refresh_dates: (boolean) When a print-job moves into a status that waits on a date (PRODUCTION_DELAYED or
+                   IN_PRODUCTION), fetch the whole print-job once to read its production_due_time and estimated shipping dates
+
+    track(id, status=None, print_job=None): Starts following a print-job. Tracking a print-job again replaces what was known about it.
+        id: (integer) The id of the print-job
+        status: (string) Its current status, if known. Without it (or print_job), the print-job is checked straight away.
+        print_job: (dictionary) The print-job, as Lulu sends it or from convert_print_job(). Its status and dates are used.
+
+    untrack(id): Stops following a print-job
+
+    on_transition(function): Adds a function to call whenever a print-job's status changes, and returns it so it can be
+        used as a decorator. The function is called from a worker thread with a dictionary:
+        {
+            id: (integer) The id of the print-job
+            previous: (string) The status before, or None if it wasn't known
+            status: (string) The new status
+            response: (dictionary) The response of get_print_job_status() ("name", "changed" and "message")
+        }
+
+    tracked(): Returns a dictionary of each followed print-job id to its last known status
+    stats(): Returns a dictionary with the number of print-jobs "tracked", status "checks" made, "transitions" seen and "errors"
+    shutdown(wait=True): Stops the poller. Using the poller as a context manager does this automatically.
+
+If a status check fails, the print-job is checked again after the usual interval for its status.
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import LuluAPI.request as request
+
+TERMINAL_STATUSES = ("SHIPPED", "CANCELED", "REJECTED")
+
+DEFAULT_INTERVALS = {
+    "CREATED": 60,
+    "UNPAID": 3600,
+    "PAYMENT_IN_PROGRESS": 60,
+    "PRODUCTION_READY": 900,
+    "PRODUCTION_DELAYED": 3600,
+    "IN_PRODUCTION": 3600,
+    "ERROR": 3600,
+}
+# For a status that isn't in the intervals, such as one Lulu adds in the future.
+DEFAULT_INTERVAL = 900
+
+
+def _epoch(value):
+    if not value:
+        return None
+    try:
+        # fromisoformat() only accepts a trailing "Z" from Python 3.11 onwards.
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+# Works for print-jobs as Lulu sends them and for master dictionaries from convert_print_job(). Returns
+# (status, production_due_time, dispatch_min), with the dates in seconds since 1970.
+def _read_print_job(print_job):
+    status = print_job.get("status")
+    if isinstance(status, dict):
+        status = status.get("name")
+    shipping_dates = print_job.get("estimated_shipping_dates") or print_job.get("shipping_information") or {}
+    return status, _epoch(print_job.get("production_due_time")), _epoch(shipping_dates.get("dispatch_min"))
+
+
+class StatusPoller:
+    def __init__(self, intervals=None, max_workers=8, jitter=0.1, max_interval=86400, refresh_dates=True):
+        self.intervals = {**DEFAULT_INTERVALS, **(intervals or {})}
+        self.jitter = jitter
+        self.max_interval = max_interval
+        self.refresh_dates = refresh_dates
+        self.checks = 0
+        self.transitions = 0
+        self.errors = 0
+        self._handlers = []
+        # Each tracked print-job id mapped to [status, production_due_time, dispatch_min, generation].
+        self._jobs = {}
+        # Each entry is (due time, tie breaker, id, generation). Entries whose generation no longer matches the print-job's
+        # (it was tracked again or untracked) are skipped when they come up, instead of being searched for and removed.
+        self._schedule = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._running = True
+        self._scheduler = threading.Thread(target=self._run_scheduler, daemon=True)
+        self._scheduler.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    def shutdown(self, wait=True):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if wait:
+            self._scheduler.join()
+        self._executor.shutdown(wait=wait)
+
+    def on_transition(self, function):
+        self._handlers.append(function)
+        return function
+
+    def track(self, id, status=None, print_job=None):
+        production_due_time = dispatch_min = None
+        if print_job is not None:
+            job_status, production_due_time, dispatch_min = _read_print_job(print_job)
+            status = status or job_status
+        if status in TERMINAL_STATUSES:
+            self.untrack(id)
+            return
+        with self._condition:
+            generation = next(self._counter)
+            job = [status, production_due_time, dispatch_min, generation]
+            self._jobs[id] = job
+            self._push(id, job, 0 if status is None else self._delay(job))
+
+    def untrack(self, id):
+        with self._condition:
+            self._jobs.pop(id, None)
+
+    def tracked(self):
+        with self._condition:
+            return {id: job[0] for id, job in self._jobs.items()}
+
+    def stats(self):
+        return {
+            "tracked": len(self._jobs),
+            "checks": self.checks,
+            "transitions": self.transitions,
+            "errors": self.errors,
+        }
+
+    def _delay(self, job):
+        status, production_due_time, dispatch_min, _ = job
+        delay = self.intervals.get(status, DEFAULT_INTERVAL)
+        now = time.time()
+        # Nothing happens to these before their date, so there is no point asking sooner.
+        if status == "PRODUCTION_DELAYED" and production_due_time is not None:
+            delay = max(delay, production_due_time - now)
+        elif status == "IN_PRODUCTION" and dispatch_min is not None:
+            delay = max(delay, dispatch_min - now)
+        delay = min(delay, self.max_interval)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    # Must be called with self._condition held.
+    def _push(self, id, job, delay):
+        heapq.heappush(self._schedule, (time.monotonic() + delay, next(self._counter), id, job[3]))
+        self._condition.notify()
+
+    def _check(self, id, generation):
+        with self._condition:
+            job = self._jobs.get(id)
+            if job is None or job[3] != generation:
+                return
+            previous = job[0]
+        try:
+            self.checks += 1
+            response = request.get_print_job_status(id)
+            status = response.get("name")
+            if status is None:
+                raise ValueError(f"Lulu did not give a status for print-job {id}: {response}")
+            dates = None
+            if status != previous and self.refresh_dates and status in ("PRODUCTION_DELAYED", "IN_PRODUCTION"):
+                dates = _read_print_job(request.lulu_get_single_print_job(id))[1:]
+        except Exception:
+            self.errors += 1
+            traceback.print_exc()
+            status = previous
+            response = None
+
+        with self._condition:
+            # The print-job may have been untracked or tracked again while it was being checked.
+            if self._jobs.get(id) is not job or job[3] != generation:
+                return
+            job[0] = status
+            if response is not None and dates is not None:
+                job[1], job[2] = dates
+            if status in TERMINAL_STATUSES:
+                del self._jobs[id]
+            elif self._running:
+                self._push(id, job, self._delay(job))
+
+        if response is not None and status != previous:
+            self.transitions += 1
+            transition = {"id": id, "previous": previous, "status": status, "response": response}
+            for handler in self._handlers:
+                try:
+                    handler(transition)
+                except Exception:
+                    traceback.print_exc()
+
+    def _run_scheduler(self):
+        with self._condition:
+            while self._running:
+                if not self._schedule:
+                    self._condition.wait()
+                    continue
+                due, _, id, generation = self._schedule[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                heapq.heappop(self._schedule)
+                job = self._jobs.get(id)
+                if job is not None and job[3] == generation:
+                    self._executor.submit(self._check, id, generation)
@@ -0,0 +1,186 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Bulk Catalog Pricing
+
+Prices every product in a catalog for every destination and shipping option through calculate_print_job_cost(), with many
+requests in flight at once but no more than a set number started per second. Each result is written to a CSV file as soon
+as it arrives, so a run that is stopped part of the way through can be started again and will only price what is missing.
+Combinations that would send Lulu the exact same request (the same product listed twice, or two regions with the same
+address) are only priced once.
+
+    summary = price_catalog(
+        products=[{"pod_package_id": "0850X1100FCPRECW080CW444MXX", "page_count": 32}, ...],
+        destinations={"US-NC": {"country_code": "US", "state_code": "NC", "postcode": "27601", ...}, ...},
+        shipping_options=["MAIL", "GROUND", "EXPRESS"],
+        output_path="prices.csv",
+    )
+
+price_catalog(products, destinations, shipping_options, output_path, max_workers=8, rate=5, resume=True): Returns a summary of the run
+    products: (list of dictionaries) Each has a "pod_package_id" and "page_count", and optionally a "quantity" (default 1)
+    destinations: (dictionary) A name for each destination (used in the CSV), mapped to the shipping_address to price it with.
+                  The address format is identical to calculate_print_job_cost().
+    shipping_options: (list of strings) The shipping options to price, identical to calculate_print_job_cost()
+    output_path: (string) The CSV file to write the prices to. While the run is going, the prices are written to
+                 output_path + ".tmp", which replaces output_path at the end.
+    max_workers: (integer) The number of requests in flight at once
+    rate: (number) The most requests to start per second. None for no limit.
+    resume: (boolean) If True and output_path exists, the prices already in it are kept and not requested again.
+            Rows that failed are requested again. If False, output_path is overwritten.
+
+    The CSV has one row per product, destination and shipping option, with the columns in CSV_COLUMNS. Money is in the
+    currency of the destination, as Lulu sends it. If a request failed, "error" holds the message and the prices are empty.
+
+    The summary dictionary contains:
+    {
+        combinations: (integer) The number of distinct product, destination and shipping option combinations
+        already_priced: (integer) Combinations found in the existing CSV and skipped
+        requests: (integer) The number of requests sent to Lulu, after removing duplicates
+        priced: (integer) Combinations priced in this run
+        failed: (integer) Combinations that failed in this run
+        elapsed: (float) The number of seconds the run took
+    }
+"""
+
+import csv
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import LuluAPI.request as request
+from LuluAPI.lulu_cache import canonical_key
+
+KEY_COLUMNS = ["pod_package_id", "page_count", "quantity", "destination", "shipping_option"]
+CSV_COLUMNS = KEY_COLUMNS + ["currency", "unit_cost_excl_tax", "line_cost_excl_tax", "shipping_cost_excl_tax",
+                             "total_cost_excl_tax", "total_tax", "total_cost_incl_tax", "error"]
+
+
+# Spaces out the start of requests so that no more than rate of them start in any second.
+class _Pacer:
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _row_key(row):
+    return tuple(str(row[column]) for column in KEY_COLUMNS)
+
+
+def _read_priced_rows(output_path):
+    with open(output_path, newline="", encoding="utf-8") as csv_file:
+        return [row for row in csv.DictReader(csv_file) if not row.get("error")]
+
+
+def _price_rows(rows, response):
+    if "line_item_costs" not in response:
+        error = response.get("detail") or str(response)
+        return [{**row, "error": error} for row in rows]
+    line_item_cost = response["line_item_costs"][0]
+    prices = {
+        "currency": response.get("currency"),
+        "unit_cost_excl_tax": line_item_cost.get("unit_tier_cost") or line_item_cost.get("cost_excl_discounts"),
+        "line_cost_excl_tax": line_item_cost.get("total_cost_excl_tax"),
+        "shipping_cost_excl_tax": (response.get("shipping_cost") or {}).get("total_cost_excl_tax"),
+        "total_cost_excl_tax": response.get("total_cost_excl_tax"),
+        "total_tax": response.get("total_tax"),
+        "total_cost_incl_tax": response.get("total_cost_incl_tax"),
+        "error": "",
+    }
+    return [{**row, **prices} for row in rows]
+
+
+def price_catalog(products, destinations, shipping_options, output_path, max_workers=8, rate=5, resume=True):
+    start = time.perf_counter()
+
+    # The run writes to temp_path and only replaces output_path once it ends. A run killed before that leaves output_path
+    # as it was, and its rows in temp_path, so both are read back when resuming.
+    temp_path = output_path + ".tmp"
+    already_priced = {}
+    if resume:
+        for path in (output_path, temp_path):
+            if os.path.exists(path):
+                for row in _read_priced_rows(path):
+                    already_priced.setdefault(_row_key(row), row)
+    done = set(already_priced)
+
+    # Every combination still to price, grouped by the request it needs, so that identical requests are sent once.
+    requests_to_send = {}
+    planned = set()
+    combinations = 0
+    skipped = 0
+    for product in products:
+        line_item = {
+            "pod_package_id": product["pod_package_id"],
+            "page_count": product["page_count"],
+            "quantity": product.get("quantity", 1),
+        }
+        for destination, shipping_address in destinations.items():
+            for shipping_option in shipping_options:
+                row = {**line_item, "destination": destination, "shipping_option": shipping_option}
+                row_key = _row_key(row)
+                # A product listed twice would otherwise give its rows twice.
+                if row_key in planned:
+                    continue
+                planned.add(row_key)
+                combinations += 1
+                if row_key in done:
+                    skipped += 1
+                    continue
+                key = canonical_key(line_item, shipping_address, shipping_option)
+                if key not in requests_to_send:
+                    requests_to_send[key] = ([line_item], shipping_address, shipping_option, [])
+                requests_to_send[key][3].append(row)
+
+    # The file is rewritten with only the rows that succeeded, so that failed rows don't appear twice.
+    with open(temp_path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerows(already_priced.values())
+        csv_file.flush()
+
+        pacer = _Pacer(rate)
+
+        def send(line_items, shipping_address, shipping_option):
+            pacer.wait()
+            return request.calculate_print_job_cost(line_items, shipping_address, shipping_option)
+
+        priced = 0
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(send, *arguments[:3]): arguments[3] for arguments in requests_to_send.values()}
+            for future in as_completed(futures):
+                rows = futures[future]
+                try:
+                    rows = _price_rows(rows, future.result())
+                except Exception as error:
+                    rows = [{**row, "error": f"{type(error).__name__}: {error}"} for row in rows]
+                for row in rows:
+                    if row["error"]:
+                        failed += 1
+                    else:
+                        priced += 1
+                writer.writerows(rows)
+                # Flushed after every result so that a run that dies loses nothing already priced.
+                csv_file.flush()
+    os.replace(temp_path, output_path)
+
+    return {
+        "combinations": combinations,
+        "already_priced": skipped,
+        "requests": len(requests_to_send),
+        "priced": priced,
+        "failed": failed,
+        "elapsed": time.perf_counter() - start,
+    }
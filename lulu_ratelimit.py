@@ -0,0 +1,270 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Rate Limiting
+
+Keeps request.py and lulu_async.py from sending Lulu more than it will accept, and recovers when Lulu says to slow down.
+Every request from either passes through here:
+
+    - A token bucket limits how many requests start per second, for all endpoints together and optionally for each endpoint.
+    - The number of requests in flight at once is adjusted as they go (AIMD): it is halved every time Lulu answers 429 Too Many
+      Requests or 503 Service Unavailable, and grows back by about one for every round of successful requests.
+    - A 429 response is retried, after waiting as long as Lulu's Retry-After header asks. Every other request waits out the
+      same pause. 502, 503 and 504 responses are retried the same way, but only for GET, PUT and DELETE requests. Those can
+      safely be sent twice. A POST like lulu_create_print_job() could create a second print-job.
+
+By default there is no limit on requests per second and up to 64 requests can be in flight, so nothing is held back until
+Lulu starts throttling.
+
+configure(rate=None, burst=None, max_concurrency=64, min_concurrency=1, max_retries=3, max_retry_wait=60): Replaces the limits shared by all endpoints.
+    rate: (number) The most requests to start per second, across all endpoints. None for no limit.
+    burst: (integer) How many requests can start at once after a quiet spell. Defaults to rate, rounded up.
+    max_concurrency: (integer) The most requests in flight at once. Concurrency starts here and never grows past it.
+    min_concurrency: (integer) Concurrency is never cut below this
+    max_retries: (integer) How many times a throttled or failed request is retried before its response is returned as it is
+    max_retry_wait: (number) The longest wait in seconds before a retry, even if Retry-After asks for longer
+
+configure_endpoint(endpoint, rate, burst=None): Adds a requests-per-second limit for one endpoint, on top of the shared limit.
+    endpoint: (string) The first part of the URL path, such as "print-jobs", "print-job-cost-calculations", "shipping-options",
+              "validate-interior", "validate-cover", "webhooks" or "webhook-submissions"
+    rate: (number) The most requests to start per second for this endpoint. None removes the endpoint's limit.
+    burst: (integer) Identical to configure()
+
+stats(): Returns a dictionary with the current "concurrency" limit, requests "in_flight", "throttled" responses seen and "retries" made.
+
+send(method, url, send_function): Used by request.py. Calls send_function() within the limits, retrying as described above, and returns its response.
+
+send_async(method, url, send_coroutine_function): Used by lulu_async.py. The same as send(), but awaits send_coroutine_function() and
+    waits on the event loop instead of blocking it. Both share the same limits, pauses, concurrency and stats().
+"""
+
+import asyncio
+import math
+import random
+import threading
+import time
+
+RETRY_STATUSES = (502, 503, 504)
+THROTTLE_STATUSES = (429, 503)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = None
+        if rate:
+            self.burst = burst or max(1, math.ceil(rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    # Takes a token and returns how many seconds the caller must wait before using it. Tokens can be taken before they
+    # are earned, which keeps callers in the order they arrived.
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.rate:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / self.rate)
+            return wait
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class AIMDLimiter:
+    def __init__(self, maximum=64, minimum=1):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        self._waiters = []
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    # Like acquire(), but waits on the event loop. release() may run in another thread, so it wakes waiting tasks
+    # through their own loop.
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            await waiter
+
+    def release(self, throttled):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            else:
+                # Growing by 1 / limit per success adds about one request per full round of requests in flight.
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                # The waiting task's loop has already closed.
+                pass
+
+
+class RateLimiter:
+    def __init__(self, rate=None, burst=None, max_concurrency=64, min_concurrency=1, max_retries=3, max_retry_wait=60):
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+        self.bucket = TokenBucket(rate, burst)
+        self.endpoint_buckets = {}
+        self.concurrency = AIMDLimiter(max_concurrency, min_concurrency)
+        self.throttled = 0
+        self.retries = 0
+
+    def send(self, method, url, send_function):
+        endpoint_bucket = self.endpoint_buckets.get(endpoint_of(url))
+        attempt = 0
+        while True:
+            wait = self.bucket.reserve()
+            if endpoint_bucket is not None:
+                wait = max(wait, endpoint_bucket.reserve())
+            if wait:
+                time.sleep(wait)
+
+            self.concurrency.acquire()
+            throttled = False
+            try:
+                response = send_function()
+                throttled = response.status_code in THROTTLE_STATUSES
+            finally:
+                self.concurrency.release(throttled)
+
+            retry_wait = self._handle_response(method, response, attempt)
+            if retry_wait is None:
+                return response
+            attempt += 1
+            time.sleep(retry_wait)
+
+    async def send_async(self, method, url, send_coroutine_function):
+        endpoint_bucket = self.endpoint_buckets.get(endpoint_of(url))
+        attempt = 0
+        while True:
+            wait = self.bucket.reserve()
+            if endpoint_bucket is not None:
+                wait = max(wait, endpoint_bucket.reserve())
+            if wait:
+                await asyncio.sleep(wait)
+
+            await self.concurrency.acquire_async()
+            throttled = False
+            try:
+                response = await send_coroutine_function()
+                throttled = response.status_code in THROTTLE_STATUSES
+            finally:
+                self.concurrency.release(throttled)
+
+            retry_wait = self._handle_response(method, response, attempt)
+            if retry_wait is None:
+                return response
+            attempt += 1
+            await asyncio.sleep(retry_wait)
+
+    # Counts the response and returns how long to wait before retrying it, or None if it shouldn't be retried.
+    def _handle_response(self, method, response, attempt):
+        if response.status_code in THROTTLE_STATUSES:
+            self.throttled += 1
+        retry_wait = self._retry_wait(method, response, attempt)
+        if retry_wait is None:
+            return None
+        if response.status_code == 429:
+            # The whole account is being throttled, so every request waits, not just this one.
+            self.bucket.pause(retry_wait)
+        self.retries += 1
+        return retry_wait
+
+    def _retry_wait(self, method, response, attempt):
+        if attempt >= self.max_retries:
+            return None
+        if response.status_code != 429 and not (response.status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS):
+            return None
+        retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is None:
+            # No Retry-After: back off exponentially from half a second, with jitter so retries don't arrive together.
+            retry_after = 0.5 * 2 ** attempt * random.uniform(0.5, 1.5)
+        return min(retry_after, self.max_retry_wait)
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+# Retry-After is either a number of seconds or an HTTP date.
+def _parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def endpoint_of(url):
+    # "https://api.lulu.com/print-jobs/12/status/" -> "print-jobs"
+    path = url.split("://", 1)[-1].split("?", 1)[0]
+    parts = path.split("/")
+    return parts[1] if len(parts) > 1 else ""
+
+
+limiter = RateLimiter()
+
+
+def configure(rate=None, burst=None, max_concurrency=64, min_concurrency=1, max_retries=3, max_retry_wait=60):
+    global limiter
+    endpoint_buckets = limiter.endpoint_buckets
+    limiter = RateLimiter(rate, burst, max_concurrency, min_concurrency, max_retries, max_retry_wait)
+    limiter.endpoint_buckets = endpoint_buckets
+
+
+def configure_endpoint(endpoint, rate, burst=None):
+    if rate is None:
+        limiter.endpoint_buckets.pop(endpoint, None)
+    else:
+        limiter.endpoint_buckets[endpoint] = TokenBucket(rate, burst)
+
+
+def stats():
+    return {
+        "concurrency": int(limiter.concurrency.limit),
+        "in_flight": limiter.concurrency.in_flight,
+        "throttled": limiter.throttled,
+        "retries": limiter.retries,
+    }
+
+
+def send(method, url, send_function):
+    return limiter.send(method, url, send_function)
+
+
+async def send_async(method, url, send_coroutine_function):
+    return await limiter.send_async(method, url, send_coroutine_function)
@@ -0,0 +1,210 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Hedged Requests and Circuit Breaker
+
+Versions of get_single_print_job(), get_print_job_status() and get_print_job_cost() for pages where a slow answer is as bad
+as no answer, such as an order status page. They are opt-in: import them from this module instead of request.py.
+
+    - Hedging: if Lulu hasn't answered within the time 95% of recent calls took, the same request is sent a second time and
+      whichever answer arrives first is used. These are read-only requests, so sending one twice is harmless.
+    - Circuit breaker: after several calls in a row fail or time out, calls stop going to Lulu for a while and are answered at
+      once with the last value seen for that id instead. After the pause, one call is let through to test whether Lulu has
+      recovered. This keeps request threads from piling up behind a Lulu that is down.
+
+get_single_print_job(id): Identical to request.get_single_print_job(), with hedging and the circuit breaker
+get_print_job_status(id): Identical to request.get_print_job_status(), with hedging and the circuit breaker
+get_print_job_cost(id): Identical to request.get_print_job_cost(), with hedging and the circuit breaker
+
+A call fails if it raises, takes longer than the timeout (a TimeoutError), or Lulu answers with a 5xx, 408 or 429
+(a request.LuluHTTPError). When the circuit is open, or when a call fails, the last value seen for that id is returned. If
+there is none, a CircuitOpenError (when the circuit is open) or the call's own error is raised. Any other 4xx, such as a 404
+for an unknown id, means Lulu is working: the error response is returned as request.py would, and is never kept as a
+last-known value.
+
+configure(hedge=True, hedge_quantile=0.95, min_hedge_delay=0.05, timeout=10, failure_threshold=5, reset_timeout=30, last_known_ttl=3600):
+    hedge: (boolean) Turns hedging on or off
+    hedge_quantile: (number between 0 and 1) The fraction of recent calls that must have finished before a second request is sent
+    min_hedge_delay: (number) A second request is never sent sooner than this many seconds after the first
+    timeout: (number) Seconds a caller waits in total before the call counts as failed
+    failure_threshold: (integer) The number of failures in a row that opens the circuit
+    reset_timeout: (number) Seconds the circuit stays open before one call is let through to test Lulu
+    last_known_ttl: (number) Seconds the last value seen for an id can still be used as a fallback
+
+stats(): Returns a dictionary with the circuit "state", the number of "hedges" sent, "hedge_wins" (hedges that answered
+first) and "fallbacks" (calls answered with a last-known value).
+
+ResilientCall(function, breaker, executor): Wraps any function that takes an id and returns Lulu's response, the same way.
+    The function must raise on error responses, for example by passing raise_for_status=True to a request.py function.
+CircuitBreaker(failure_threshold=5, reset_timeout=30): The circuit breaker shared by the functions above.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import LuluAPI.request as request
+from LuluAPI.lulu_cache import TTLCache
+
+HEDGE = True
+HEDGE_QUANTILE = 0.95
+MIN_HEDGE_DELAY = 0.05
+TIMEOUT = 10
+LAST_KNOWN_TTL = 3600
+
+# A second request is only timed from the quantile once this many calls have been measured.
+MIN_SAMPLES = 20
+
+_MISSING = object()
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    # Returns True if a call may go to Lulu. While half open, only the first caller is let through to test it.
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class ResilientCall:
+    def __init__(self, function, breaker, executor):
+        self.function = function
+        self.breaker = breaker
+        self.executor = executor
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+        self._latencies = deque(maxlen=500)
+        self._last_known = TTLCache(ttl=LAST_KNOWN_TTL, max_entries=100000)
+
+    def __call__(self, id):
+        if not self.breaker.allow():
+            return self._fallback(id, CircuitOpenError("Lulu is failing, so the circuit breaker is not letting calls through"))
+        try:
+            response = self._hedged_call(id)
+        except request.LuluHTTPError as error:
+            if error.rejected:
+                # Lulu is working and refused this request, such as a 404 for an unknown id. Its answer is returned like
+                # request.py does, but isn't kept as a last-known value.
+                self.breaker.record_success()
+                return error.response
+            self.breaker.record_failure()
+            return self._fallback(id, error)
+        except Exception as error:
+            self.breaker.record_failure()
+            return self._fallback(id, error)
+        self.breaker.record_success()
+        self._last_known.set(id, response)
+        return response
+
+    def _fallback(self, id, error):
+        response = self._last_known.get(id, _MISSING)
+        if response is _MISSING:
+            raise error
+        self.fallbacks += 1
+        return response
+
+    def _hedge_delay(self):
+        latencies = sorted(self._latencies)
+        if len(latencies) < MIN_SAMPLES:
+            return max(MIN_HEDGE_DELAY, TIMEOUT / 4)
+        return max(MIN_HEDGE_DELAY, latencies[int(HEDGE_QUANTILE * (len(latencies) - 1))])
+
+    def _timed(self, id):
+        start = time.monotonic()
+        response = self.function(id)
+        self._latencies.append(time.monotonic() - start)
+        return response
+
+    def _hedged_call(self, id):
+        deadline = time.monotonic() + TIMEOUT
+        primary = self.executor.submit(self._timed, id)
+        pending = {primary}
+        if HEDGE:
+            done, _ = wait(pending, timeout=min(self._hedge_delay(), TIMEOUT))
+            if not done:
+                self.hedges += 1
+                pending.add(self.executor.submit(self._timed, id))
+
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        raise TimeoutError(f"Lulu did not answer within {TIMEOUT} seconds")
+
+
+breaker = CircuitBreaker()
+# Enough threads for every caller to have a request and a hedge in flight, without one thread per caller.
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="lulu-hedge")
+
+# The wrapped functions raise on error responses, which request.py otherwise returns like any answer.
+get_single_print_job = ResilientCall(lambda id: request.get_single_print_job(id, raise_for_status=True), breaker, _executor)
+get_print_job_status = ResilientCall(lambda id: request.get_print_job_status(id, raise_for_status=True), breaker, _executor)
+get_print_job_cost = ResilientCall(lambda id: request.get_print_job_cost(id, raise_for_status=True), breaker, _executor)
+
+_calls = (get_single_print_job, get_print_job_status, get_print_job_cost)
+
+
+def configure(hedge=True, hedge_quantile=0.95, min_hedge_delay=0.05, timeout=10, failure_threshold=5, reset_timeout=30,
+              last_known_ttl=3600):
+    global HEDGE, HEDGE_QUANTILE, MIN_HEDGE_DELAY, TIMEOUT, LAST_KNOWN_TTL
+    HEDGE = hedge
+    HEDGE_QUANTILE = hedge_quantile
+    MIN_HEDGE_DELAY = min_hedge_delay
+    TIMEOUT = timeout
+    LAST_KNOWN_TTL = last_known_ttl
+    breaker.failure_threshold = failure_threshold
+    breaker.reset_timeout = reset_timeout
+    for call in _calls:
+        call._last_known.ttl = last_known_ttl
+
+
+def stats():
+    return {
+        "state": breaker.state,
+        "hedges": sum(call.hedges for call in _calls),
+        "hedge_wins": sum(call.hedge_wins for call in _calls),
+        "fallbacks": sum(call.fallbacks for call in _calls),
+    }
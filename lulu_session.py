@@ -0,0 +1,81 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Session Handler
+
+Houses the shared HTTP session that every function in request.py sends its requests through. Reusing one session keeps
+TCP and TLS connections to Lulu alive between calls instead of opening a new connection for every request.
+
+configure(pool_connections=10, pool_maxsize=10, pool_block=False, max_retries=0): Rebuilds the shared session with a new connection pool.
+    pool_connections: (integer) The number of hosts that keep their own pool of connections (api.lulu.com and api.sandbox.lulu.com count separately)
+    pool_maxsize: (integer) The maximum number of kept-alive connections to a single host. This is the per-host connection limit.
+    pool_block: (boolean) If True, a call waits for a free connection once pool_maxsize connections are in use. If False, extra
+                connections are opened and thrown away after use instead of being kept alive.
+    max_retries: (integer) The number of times a connection error is retried before giving up
+
+get_session(): Returns the shared requests.Session, building it with the default pool settings on first use.
+
+request(method, url, **kwargs): Identical to requests.request(), but sent through the shared session.
+
+close(): Closes every kept-alive connection. The next request will build a new session.
+"""
+
+import threading
+
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 10
+POOL_BLOCK = False
+MAX_RETRIES = 0
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    # requests is imported here rather than at the top of the module because importing it takes longer than importing
+    # the rest of the library combined. Programs that import the library but never send a request don't pay for it.
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                          max_retries=MAX_RETRIES, pool_block=POOL_BLOCK)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def configure(pool_connections=10, pool_maxsize=10, pool_block=False, max_retries=0):
+    global POOL_CONNECTIONS, POOL_MAXSIZE, POOL_BLOCK, MAX_RETRIES, _session
+    with _session_lock:
+        POOL_CONNECTIONS = pool_connections
+        POOL_MAXSIZE = pool_maxsize
+        POOL_BLOCK = pool_block
+        MAX_RETRIES = max_retries
+        old_session = _session
+        _session = _build_session()
+    if old_session is not None:
+        old_session.close()
+
+
+def get_session():
+    global _session
+    # The session is built lazily so that importing this module never touches the network.
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def request(method, url, **kwargs):
+    return get_session().request(method, url, **kwargs)
+
+
+def close():
+    global _session
+    with _session_lock:
+        old_session = _session
+        _session = None
+    if old_session is not None:
+        old_session.close()
@@ -0,0 +1,207 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Bulk Print-Job Submission
+
+Submits many orders at once through lulu_create_print_job(), without ever creating the same print-job twice. Every order
+must have an external_id. Before anything is sent, the external_ids of your existing print-jobs are found with a single scan
+of lulu_get_print_jobs() (or from a local SubmissionIndex), and orders that are already at Lulu are skipped. The rest are
+sent in parallel. If a batch dies part of the way through, calling submit_print_jobs() again with the same orders only
+sends the ones that didn't make it.
+
+    report = submit_print_jobs(orders, scan_filters={"created_after": "2024-01-01T00:00:00Z"})
+    for result in report["results"]:
+        print(result["external_id"], result["status"], result["id"])
+
+submit_print_jobs(orders, max_workers=8, scan_filters=None, index=None, scan=None): Returns a report of the submission
+    orders: (list of dictionaries) Each order is identical to the dictionary given to create_print_job(), and must have an "external_id"
+    max_workers: (integer) The number of print-jobs sent to Lulu at once
+    scan_filters: (dictionary) Filters for the scan of existing print-jobs, identical to lulu_get_print_jobs(). Narrowing
+                  the scan with "created_after" makes it much faster, as long as no earlier print-job could share an external_id.
+    index: (SubmissionIndex) A local record of every submission. See below.
+    scan: (boolean) Whether to scan Lulu for existing print-jobs. True always scans and False never does. None (the
+          default) always scans without an index. With an index, it only scans the first time the index is used, or if a
+          previous run was interrupted while sending, since only then can the index be missing a print-job. Orders
+          created some other way than submit_print_jobs() are not in the index, so pass scan=True if there could be any.
+
+    The report dictionary contains:
+    {
+        created: (integer) The number of print-jobs created
+        existing: (integer) The number of orders that were already at Lulu, and were not sent
+        failed: (integer) The number of orders that failed
+        scanned: (boolean) Whether Lulu was scanned for existing print-jobs
+        elapsed: (float) The number of seconds the submission took
+        results: (list of dictionaries) One for each order, in the same order as orders
+            Each dictionary contains:
+            {
+                external_id: (string) The external_id of the order
+                status: (string) "created", "existing", "duplicate" (the external_id appears earlier in orders) or "failed"
+                id: (integer) The id of the print-job at Lulu, or None
+                print_job: (dictionary) For "created", the master dictionary returned by create_print_job()
+                error: (string) For "failed", what went wrong. For a rejected order, this is Lulu's response.
+            }
+    }
+
+    An order whose request fails without a clear answer from Lulu (a dropped connection, or a 5xx, 408 or 429 response)
+    is reported as "failed", but Lulu may still have created it. Calling submit_print_jobs() again finds it in the scan
+    and reports it as "existing" instead of sending it a second time. Only an order Lulu refused outright (any other 4xx)
+    is sent again without checking.
+
+SubmissionIndex(path="lulu_submissions.sqlite3"): Records every order sent by submit_print_jobs() in a SQLite database,
+by external_id, so a later run can skip the orders already created without scanning Lulu.
+    get(external_id): Returns the print-job id recorded for external_id, or None
+    pending(): Returns the external_ids that were being sent when a run was interrupted
+    close(): Closes the database.
+"""
+
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import LuluAPI.request as request
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    external_id TEXT PRIMARY KEY,
+    print_job_id INTEGER,
+    updated REAL NOT NULL
+);
+"""
+
+
+class SubmissionIndex:
+    def __init__(self, path="lulu_submissions.sqlite3"):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def get(self, external_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT print_job_id FROM submissions WHERE external_id = ?", (external_id,)).fetchone()
+        return row[0] if row else None
+
+    # A row without a print_job_id was being sent and never got an answer.
+    def pending(self):
+        with self._lock:
+            return [row[0] for row in self._connection.execute(
+                "SELECT external_id FROM submissions WHERE print_job_id IS NULL")]
+
+    def _created(self):
+        with self._lock:
+            return dict(self._connection.execute(
+                "SELECT external_id, print_job_id FROM submissions WHERE print_job_id IS NOT NULL"))
+
+    def _record(self, external_id, print_job_id):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO submissions VALUES (?, ?, ?)", (external_id, print_job_id, time.time()))
+
+    def _forget(self, external_id):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM submissions WHERE external_id = ?", (external_id,))
+
+
+# Returns {external_id: print-job id} for every print-job at Lulu matching filters, from one pass over the pages.
+def _scan_existing(filters):
+    filters = {"page_size": 100, **(filters or {}), "exclude_line_items": True}
+    existing = {}
+    for item in request.iter_print_jobs(filters, convert=False):
+        if item.get("external_id"):
+            existing.setdefault(item["external_id"], item["id"])
+    return existing
+
+
+def _submit(order, index):
+    external_id = order["external_id"]
+    if index is not None:
+        # Recorded before sending, so an interrupted run leaves a trace that makes the next run check Lulu.
+        index._record(external_id, None)
+    try:
+        response = request.lulu_create_print_job(
+            order["line_items"], order["shipping_information"], order["shipping_information"]["level"],
+            order["shipping_information"]["email"], external_id, order.get("production_delay", 60), raise_for_status=True)
+    except request.LuluHTTPError as error:
+        if error.rejected:
+            # Lulu refused the order itself, so nothing was created and it can safely be sent again.
+            if index is not None:
+                index._forget(external_id)
+            return {"external_id": external_id, "status": "failed", "id": None, "print_job": None,
+                    "error": str(error.response)}
+        # A 5xx, 408 or 429 doesn't say whether the print-job was created, so the order stays pending in the index
+        # and the next run scans Lulu for it.
+        return {"external_id": external_id, "status": "failed", "id": None, "print_job": None, "error": str(error)}
+    except Exception as error:
+        return {"external_id": external_id, "status": "failed", "id": None, "print_job": None,
+                "error": f"{type(error).__name__}: {error}"}
+
+    if not isinstance(response, dict) or "id" not in response:
+        return {"external_id": external_id, "status": "failed", "id": None, "print_job": None,
+                "error": f"Lulu's response has no print-job id: {response}"}
+
+    if index is not None:
+        index._record(external_id, response["id"])
+    return {"external_id": external_id, "status": "created", "id": response["id"],
+            "print_job": request.convert_created_print_job(order, response), "error": None}
+
+
+def submit_print_jobs(orders, max_workers=8, scan_filters=None, index=None, scan=None):
+    start = time.perf_counter()
+
+    existing = index._created() if index is not None else {}
+    if scan is None:
+        # An empty index hasn't seen any print-jobs created before it was first used, so Lulu is scanned then as well.
+        scan = index is None or not existing or bool(index.pending())
+    if scan:
+        for external_id, print_job_id in _scan_existing(scan_filters).items():
+            existing.setdefault(external_id, print_job_id)
+            if index is not None:
+                index._record(external_id, print_job_id)
+
+    results = [None] * len(orders)
+    to_send = []
+    seen = set()
+    for position, order in enumerate(orders):
+        external_id = order.get("external_id")
+        if not external_id:
+            results[position] = {"external_id": external_id, "status": "failed", "id": None, "print_job": None,
+                                 "error": "external_id is required to submit an order safely"}
+        elif external_id in seen:
+            results[position] = {"external_id": external_id, "status": "duplicate", "id": None, "print_job": None,
+                                 "error": None}
+        elif external_id in existing:
+            results[position] = {"external_id": external_id, "status": "existing", "id": existing[external_id],
+                                 "print_job": None, "error": None}
+        else:
+            to_send.append(position)
+        seen.add(external_id)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(position, executor.submit(_submit, orders[position], index)) for position in to_send]
+        for position, future in futures:
+            results[position] = future.result()
+
+    # A repeated external_id shares the print-job of its first appearance, once that is known.
+    first_ids = {}
+    for result in results:
+        if result["status"] in ("created", "existing"):
+            first_ids.setdefault(result["external_id"], result["id"])
+        elif result["status"] == "duplicate":
+            result["id"] = first_ids.get(result["external_id"])
+
+    statuses = [result["status"] for result in results]
+    return {
+        "created": statuses.count("created"),
+        "existing": statuses.count("existing"),
+        "failed": statuses.count("failed"),
+        "scanned": scan,
+        "elapsed": time.perf_counter() - start,
+        "results": results,
+    }
@@ -3,18 +3,39 @@
 - Mission Control LLC
 - Token Retrieval
 
-Houses the client keys generated by Lulu. Contains 1 function:
+Houses the client keys generated by Lulu. Tokens are cached until shortly before they expire, so Lulu's token endpoint
+is only asked for a new token once the old one runs out. Contains 4 functions:
 
 get_token(json=False): Returns a single string by default, the authentication code that all GET requests require.
             If json=True, it will return the entire JSON dictionary that was returned by Lulu.
+            The token is served from the cache while it is valid. When it is about to expire, exactly one caller fetches
+            a new token while any other threads asking at the same time wait for it.
+
+invalidate_token(auth_code=None): Throws away the cached token so the next get_token() fetches a new one.
+            auth_code: (string) If given, the cache is only cleared when it still holds this token. This lets many callers
+                       that were all rejected with the same token trigger a single refresh.
+
+fetch_token(json=False): Always asks Lulu for a new token, skipping the cache. Takes the same argument as get_token().
+
+set_url_prefix(url_prefix): Points the token requests at another server with Lulu's API, and throws away the cached token.
+            Use request.set_url_prefix() instead, which also moves every other request.
+
+The LULU_URLPREFIX environment variable, if it is set, replaces URLPREFIX when this module is imported. For example,
+LULU_URLPREFIX=http://127.0.0.1:8080/ sends everything to a local benchmarks/fake_lulu.py server.
+
+Importing this module does not contact Lulu. The first token is fetched by the first API call.
 """
 
-import requests
+import os
+import threading
+import time
+
+import LuluAPI.lulu_codec as codec
+import LuluAPI.lulu_session as session
 
 SANDBOX = True
 
 if SANDBOX:
-    print("***SANDBOX ACTIVE***")
     URLPREFIX = "https://api.sandbox.lulu.com/"
 
     """SANDBOX CLIENT KEYS"""
@@ -37,6 +58,9 @@ else:
     # This is the combined key in base 64. The word "basic" is required prior to the rest of the code.
     BASE64_KEY_SECRET = ""
 
+if os.environ.get("LULU_URLPREFIX"):
+    URLPREFIX = os.environ["LULU_URLPREFIX"].rstrip("/") + "/"
+
 # The URL to retrieve a OAuth (the communication system) token. Tokens expire after a few minutes.
 url = f"{URLPREFIX}auth/realms/glasstree/protocol/openid-connect/token"
 
@@ -52,13 +76,29 @@ payload = {
     "grant_type": "client_credentials"
 }
 
-def get_token(json=False):
+# Refresh the token this many seconds before Lulu says it expires, so a request never leaves with a token that dies in flight.
+REFRESH_MARGIN = 30
+
+# Used when Lulu does not send expires_in with the token.
+DEFAULT_EXPIRES_IN = 300
+
+
+_sandbox_notice_shown = False
+
+
+def fetch_token(json=False):
+    global _sandbox_notice_shown
+    # The notice is shown on the first request instead of at import, so that importing the library has no side effects.
+    if SANDBOX and not _sandbox_notice_shown:
+        print("***SANDBOX ACTIVE***")
+        _sandbox_notice_shown = True
+
     # Retrieve the authentication from Lulu
-    token_response = requests.post(url, headers=headers, data=payload)
+    token_response = session.request("POST", url, headers=headers, data=payload)
 
     # If successful, the response will have status 200.
     if token_response.status_code == 200:
-        token_data = token_response.json()
+        token_data = codec.loads(token_response.content)
         auth_code = token_data["access_token"]
         if json:
             return token_data
@@ -67,3 +107,64 @@ def get_token(json=False):
     else:
 
         raise KeyError(f"Failed to get token. Status code: {token_response.status_code}")
+
+
+class TokenManager:
+    def __init__(self, refresh_margin=REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        # The token and its refresh deadline are stored together so that readers never see one without the other.
+        self._cached = None
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, cached):
+        return cached is not None and time.monotonic() < cached[1]
+
+    def get(self, json=False):
+        cached = self._cached
+        if not self._is_fresh(cached):
+            with self._lock:
+                # Another caller may have refreshed the token while this one was waiting for the lock.
+                cached = self._cached
+                if not self._is_fresh(cached):
+                    token_data = fetch_token(json=True)
+                    expires_in = token_data.get("expires_in") or DEFAULT_EXPIRES_IN
+                    refresh_at = time.monotonic() + max(expires_in - self.refresh_margin, 0)
+                    cached = (token_data, refresh_at)
+                    self._cached = cached
+        token_data = cached[0]
+        if json:
+            return token_data
+        return token_data["access_token"]
+
+    # Returns the cached token if it is still fresh, or None. Never contacts Lulu, so it is safe to call from an event loop.
+    def cached(self, json=False):
+        cached = self._cached
+        if not self._is_fresh(cached):
+            return None
+        if json:
+            return cached[0]
+        return cached[0]["access_token"]
+
+    def invalidate(self, auth_code=None):
+        with self._lock:
+            if auth_code is None or (self._cached is not None and self._cached[0]["access_token"] == auth_code):
+                self._cached = None
+
+
+token_manager = TokenManager()
+
+
+def get_token(json=False):
+    return token_manager.get(json)
+
+
+def invalidate_token(auth_code=None):
+    token_manager.invalidate(auth_code)
+
+
+def set_url_prefix(url_prefix):
+    global URLPREFIX, url
+    URLPREFIX = url_prefix.rstrip("/") + "/"
+    url = f"{URLPREFIX}auth/realms/glasstree/protocol/openid-connect/token"
+    # A token from one server is no good on another.
+    token_manager.invalidate()
@@ -0,0 +1,212 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- File Validation Engine
+
+Submits many interior and cover files to Lulu for validation at once and waits for each one to finish. Instead of checking
+every file on a fixed timer, each file is checked again after a delay that doubles every time it is still not finished, with
+a little randomness (jitter) so that hundreds of files don't all get checked at the same moment. A single scheduler thread
+keeps track of when each file is next due, so waiting files don't tie up any threads.
+
+    with ValidationEngine() as engine:
+        futures = engine.submit_many([
+            {"type": "interior", "link": "https://.../interior.pdf", "pod_package_id": "0850X1100FCPRECW080CW444MXX"},
+            {"type": "cover", "link": "https://.../cover.pdf", "pod_package_id": "0850X1100FCPRECW080CW444MXX", "interior_page_count": 212},
+        ])
+        for result in engine.as_completed(futures):
+            print(result["source_url"], result["status"])
+
+ValidationEngine(max_workers=8, initial_delay=2, max_delay=60, multiplier=2, jitter=0.25, timeout=1800, cache=None):
+    max_workers: (integer) The number of requests to Lulu that can be in flight at once
+    initial_delay: (number) Seconds to wait before the first status check
+    max_delay: (number) The longest wait, in seconds, between two status checks of one file
+    multiplier: (number) How much longer each wait is than the one before it
+    jitter: (number between 0 and 1) How much each wait is randomly lengthened or shortened, as a fraction of the wait
+    timeout: (number) Seconds after which a file that is still not finished fails with a TimeoutError
+    cache: (ValidationCache) If given, files that were validated before are answered from the cache without asking Lulu,
+           and every finished validation is stored in it. See lulu_validation_cache.py.
+
+    submit_interior(link, pod_package_id="", md5=None): Returns a Future for the finished validation of an interior file.
+        The arguments are identical to request.post_interior_file_validation(), plus:
+        md5: (string) The MD5 hash of the file, used to look it up in the cache. If there is a cache and this is not given,
+             the file is downloaded to work it out.
+
+    submit_cover(link, pod_package_id, interior_page_count, md5=None): Returns a Future for the finished validation of a cover file.
+        The arguments are identical to request.post_cover_file_validation(), plus md5, which is identical to submit_interior()
+
+    submit_many(files): Returns a list of Futures, one for each file, in the same order
+        files: (list of dictionaries) Each dictionary has a "type" of "interior" or "cover", plus the arguments of submit_interior() or submit_cover()
+
+    as_completed(futures, timeout=None): Yields the finished validation results, in the order they finish.
+        A file that failed (a request raised an error or the file timed out) raises its error here.
+
+    async_as_completed(futures): The same as as_completed(), but as an async iterator for use inside asyncio code.
+
+    shutdown(wait=True): Stops the engine. Using the engine as a context manager does this automatically.
+
+Each Future's result is the final JSON response from get_interior_file_validation() or get_cover_file_validation(), with a status of
+"VALIDATED", "NORMALIZED" or "ERROR". If Lulu refuses a file outright (the first response has no id), that response is the
+result. An error response to a status check, such as a 500, doesn't end the validation: the file is checked again later.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+import LuluAPI.request as request
+from LuluAPI.lulu_validation_cache import md5_of_url
+
+FINAL_STATUSES = ("VALIDATED", "NORMALIZED", "ERROR")
+
+
+class ValidationEngine:
+    def __init__(self, max_workers=8, initial_delay=2, max_delay=60, multiplier=2, jitter=0.25, timeout=1800, cache=None):
+        self.cache = cache
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Each entry is (due time, tie breaker, future, function). The counter keeps futures from ever being compared.
+        self._schedule = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._running = True
+        self._scheduler = threading.Thread(target=self._run_scheduler, daemon=True)
+        self._scheduler.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    def shutdown(self, wait=True):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if wait:
+            self._scheduler.join()
+        self._executor.shutdown(wait=wait)
+        # Files that were still waiting for their next status check will never finish now.
+        with self._condition:
+            for _, _, future, _ in self._schedule:
+                future.cancel()
+            self._schedule.clear()
+
+    def submit_interior(self, link, pod_package_id="", md5=None):
+        return self._submit(lambda: request.post_interior_file_validation(link, pod_package_id),
+                            request.get_interior_file_validation,
+                            (link, md5, "interior", pod_package_id, None))
+
+    def submit_cover(self, link, pod_package_id, interior_page_count, md5=None):
+        return self._submit(lambda: request.post_cover_file_validation(link, pod_package_id, interior_page_count),
+                            request.get_cover_file_validation,
+                            (link, md5, "cover", pod_package_id, interior_page_count))
+
+    def submit_many(self, files):
+        futures = []
+        for file in files:
+            if file["type"] == "interior":
+                futures.append(self.submit_interior(file["link"], file.get("pod_package_id", ""), file.get("md5")))
+            elif file["type"] == "cover":
+                futures.append(self.submit_cover(file["link"], file["pod_package_id"], file["interior_page_count"],
+                                                 file.get("md5")))
+            else:
+                raise ValueError(f"file type must be either 'interior' or 'cover', not {file['type']!r}")
+        return futures
+
+    def as_completed(self, futures, timeout=None):
+        for future in as_completed(futures, timeout=timeout):
+            yield future.result()
+
+    async def async_as_completed(self, futures):
+        for future in asyncio.as_completed([asyncio.wrap_future(future) for future in futures]):
+            yield await future
+
+    def _submit(self, post, get, file):
+        future = Future()
+        deadline = time.monotonic() + self.timeout
+        self._executor.submit(self._post, future, post, get, file, deadline)
+        return future
+
+    def _post(self, future, post, get, file, deadline):
+        if future.cancelled():
+            return
+        try:
+            if self.cache is not None:
+                link, md5, kind, pod_package_id, interior_page_count = file
+                cache_key = (md5 or md5_of_url(link), kind, pod_package_id, interior_page_count)
+                cached = self.cache.get(*cache_key)
+                if cached is not None:
+                    future.set_result(cached)
+                    return
+                # The result is stored in the cache when the future finishes, however many polls that takes.
+                future.add_done_callback(lambda done: self._store(done, cache_key))
+            response = post()
+        except Exception as error:
+            future.set_exception(error)
+            return
+        # Without an id, Lulu refused the file outright and there is nothing to poll.
+        if "id" not in response:
+            future.set_result(response)
+            return
+        self._finish_or_reschedule(future, response, response["id"], get, deadline, 0)
+
+    def _store(self, future, cache_key):
+        if future.cancelled() or future.exception() is not None:
+            return
+        md5, kind, pod_package_id, interior_page_count = cache_key
+        self.cache.put(md5, kind, future.result(), pod_package_id, interior_page_count)
+
+    def _poll(self, future, id, get, deadline, attempt):
+        if future.cancelled():
+            return
+        try:
+            response = get(id)
+        except Exception as error:
+            future.set_exception(error)
+            return
+        self._finish_or_reschedule(future, response, id, get, deadline, attempt)
+
+    # A poll answered with an error body (no id, such as a 500) is retried like any unfinished file, until the deadline.
+    def _finish_or_reschedule(self, future, response, id, get, deadline, attempt):
+        if "id" in response and response.get("status") in FINAL_STATUSES:
+            future.set_result(response)
+            return
+        delay = self._delay(attempt)
+        if time.monotonic() + delay > deadline:
+            future.set_exception(TimeoutError(f"Validation {id} did not finish in {self.timeout} seconds"))
+            return
+        self._schedule_call(delay, future, lambda: self._poll(future, id, get, deadline, attempt + 1))
+
+    def _delay(self, attempt):
+        delay = min(self.max_delay, self.initial_delay * self.multiplier ** attempt)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _schedule_call(self, delay, future, function):
+        with self._condition:
+            if not self._running:
+                future.cancel()
+                return
+            heapq.heappush(self._schedule, (time.monotonic() + delay, next(self._counter), future, function))
+            self._condition.notify()
+
+    def _run_scheduler(self):
+        with self._condition:
+            while self._running:
+                if not self._schedule:
+                    self._condition.wait()
+                    continue
+                due, _, _, function = self._schedule[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                heapq.heappop(self._schedule)
+                self._executor.submit(function)
@@ -0,0 +1,184 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- File Validation Cache
+
+Remembers the final result of every file validation in a SQLite database, so that validating the same file again (for
+example when a title is reprinted) returns straight away without asking Lulu. A result is found by the MD5 hash of the
+file's contents (the same hash Lulu reports as source_md5_sum), whether it was an interior or a cover, the pod_package_id
+it was validated against and, for covers, the interior page count. The same file at a different link is still found.
+
+    cache = ValidationCache("validations.sqlite3")
+    with ValidationEngine(cache=cache) as engine:
+        future = engine.submit_interior(link, pod_package_id, md5=known_md5)
+
+ValidationCache(path="lulu_validation_cache.sqlite3", max_entries=10000, max_age=None):
+    path: (string) The SQLite database file. ":memory:" keeps the cache in memory for the life of the program.
+    max_entries: (integer) Once there are more results than this, the least recently used ones are removed
+    max_age: (number) Results older than this many seconds are ignored and removed. None keeps them forever.
+
+    get(md5, kind, pod_package_id="", interior_page_count=None): Returns the stored validation result, or None
+        md5: (string) The MD5 hash of the file, as a hex string
+        kind: (string) "interior" or "cover"
+        pod_package_id: (string) The pod_package_id the file was validated against
+        interior_page_count: (integer) The interior page count the cover was validated against. Not used for interiors.
+
+    put(md5, kind, result, pod_package_id="", interior_page_count=None): Stores a validation result. Results that are
+        not finished (status is not "VALIDATED", "NORMALIZED" or "ERROR") are not stored.
+
+    invalidate(md5, kind=None, pod_package_id=None, interior_page_count=None): Removes every stored result for the file that
+        matches the arguments given. invalidate(md5) removes every result for that file.
+
+    evict(): Removes results past max_age, then the least recently used results beyond max_entries. Returns how many were removed.
+
+    clear(): Removes every stored result.
+
+    close(): Closes the database.
+
+    The stored result is the final JSON response from Lulu, with "page_count", "valid_pod_package_ids" and "errors".
+
+md5_of_url(url): Returns the MD5 hash of the file at url. The file is streamed, so it is never held in memory all at once.
+
+md5_of_file(path): Returns the MD5 hash of a local file.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+
+import LuluAPI.lulu_codec as codec
+import LuluAPI.lulu_session as session
+
+FINAL_STATUSES = ("VALIDATED", "NORMALIZED", "ERROR")
+
+_CHUNK_SIZE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS validations (
+    source_md5_sum TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    pod_package_id TEXT NOT NULL,
+    interior_page_count INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    page_count INTEGER,
+    valid_pod_package_ids TEXT,
+    errors TEXT,
+    result BLOB NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (source_md5_sum, kind, pod_package_id, interior_page_count)
+);
+CREATE INDEX IF NOT EXISTS validations_last_used ON validations (last_used);
+"""
+
+
+def md5_of_url(url):
+    digest = hashlib.md5()
+    with session.request("GET", url, stream=True) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def md5_of_file(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ValidationCache:
+    def __init__(self, path="lulu_validation_cache.sqlite3", max_entries=10000, max_age=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        # One connection is shared by every thread of the validation engine, with a lock around each use.
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    # Interiors aren't validated against a page count, so they are all stored under 0.
+    def _key(self, md5, kind, pod_package_id, interior_page_count):
+        if kind not in ("interior", "cover"):
+            raise ValueError(f"kind must be either 'interior' or 'cover', not {kind!r}")
+        page_count = interior_page_count if kind == "cover" else 0
+        return md5.lower(), kind, pod_package_id or "", page_count or 0
+
+    def get(self, md5, kind, pod_package_id="", interior_page_count=None):
+        key = self._key(md5, kind, pod_package_id, interior_page_count)
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT result, created FROM validations WHERE source_md5_sum = ? AND kind = ? AND pod_package_id = ? "
+                "AND interior_page_count = ?", key).fetchone()
+            if row is None:
+                return None
+            result, created = row
+            if self.max_age is not None and now - created > self.max_age:
+                self._connection.execute(
+                    "DELETE FROM validations WHERE source_md5_sum = ? AND kind = ? AND pod_package_id = ? "
+                    "AND interior_page_count = ?", key)
+                return None
+            self._connection.execute(
+                "UPDATE validations SET last_used = ? WHERE source_md5_sum = ? AND kind = ? AND pod_package_id = ? "
+                "AND interior_page_count = ?", (now, *key))
+        return codec.loads(result)
+
+    def put(self, md5, kind, result, pod_package_id="", interior_page_count=None):
+        if result.get("status") not in FINAL_STATUSES:
+            return
+        key = self._key(md5, kind, pod_package_id, interior_page_count)
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO validations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, result["status"], _page_count(result.get("page_count")),
+                 codec.dumps(result.get("valid_pod_package_ids")), codec.dumps(result.get("errors")),
+                 codec.dumps(result), now, now))
+            self._evict()
+
+    def invalidate(self, md5, kind=None, pod_package_id=None, interior_page_count=None):
+        conditions = ["source_md5_sum = ?"]
+        parameters = [md5.lower()]
+        for column, value in (("kind", kind), ("pod_package_id", pod_package_id),
+                              ("interior_page_count", interior_page_count)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        with self._lock, self._connection:
+            return self._connection.execute(
+                f"DELETE FROM validations WHERE {' AND '.join(conditions)}", parameters).rowcount
+
+    def evict(self):
+        with self._lock, self._connection:
+            return self._evict()
+
+    def _evict(self):
+        removed = 0
+        if self.max_age is not None:
+            removed += self._connection.execute(
+                "DELETE FROM validations WHERE created < ?", (time.time() - self.max_age,)).rowcount
+        removed += self._connection.execute(
+            "DELETE FROM validations WHERE rowid IN (SELECT rowid FROM validations ORDER BY last_used DESC "
+            "LIMIT -1 OFFSET ?)", (self.max_entries,)).rowcount
+        return removed
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM validations")
+
+
+# Lulu sends the interior page count as a string.
+def _page_count(page_count):
+    try:
+        return int(page_count)
+    except (TypeError, ValueError):
+        return None
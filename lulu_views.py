@@ -0,0 +1,187 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Print-Job Views
+
+Read-only, lazy versions of the simple dictionaries that request.convert_print_job() builds. A PrintJob wraps the dictionary
+Lulu sent and only works out a field when that field is read, so code that only looks at a print-job's id and status never
+pays for building its shipping, cost and print information.
+
+PrintJob and LineItem behave like read-only dictionaries with exactly the same keys and values as the output of
+convert_print_job(). job["shipping_information"]["city"], job.get("order_id"), "id" in job, job.keys() and job == dictionary
+all work. Fields are worked out again on every read, so read a field into a variable if you need it many times.
+
+PrintJob(lulu_dictionary): A view of a print-job from lulu_get_print_jobs() or lulu_get_single_print_job()
+    raw: The dictionary Lulu sent
+    to_dict(): Returns the same dictionary convert_print_job() would, with every field filled in
+
+LineItem(lulu_line_item): A view of a single line item, returned from the "line_items" field of a PrintJob
+    raw: The dictionary Lulu sent
+    to_dict(): Returns the same dictionary as the matching line item from convert_print_job()
+"""
+
+from collections.abc import Mapping
+
+
+def _messages(item):
+    return item["status"]["messages"]
+
+
+def _normalized_file(normalization):
+    return normalization.get("normalized_file", {}) or {}
+
+
+def _print_file(item, side):
+    normalization = item["printable_normalization"][side]
+    return {
+        "job_id": normalization.get("job_id"),
+        "file_id": _normalized_file(normalization).get("file_id"),
+        "filename": _normalized_file(normalization).get("filename"),
+        "source_md5_sum": normalization.get("source_md5_sum"),
+        "source_url": normalization.get("source_url"),
+    }
+
+
+def _status_info(item):
+    messages = _messages(item)
+    return {
+        "delay": messages.get("delay"),
+        "error": messages.get("error"),
+        "info": messages.get("info"),
+        "cover_errors": messages.get("printable_normalization", {}).get("cover"),
+        "interior_errors": messages.get("printable_normalization", {}).get("interior"),
+        "timestamp": messages.get("timestamp"),
+    }
+
+
+def _reprint_info(item):
+    reprint_info = item.get("reprint_info") or {}
+    return {
+        "defect": reprint_info.get("defect"),
+        "description": reprint_info.get("description"),
+        "cost_center": reprint_info.get("cost_center"),
+        "printer_at_fault": reprint_info.get("printer_at_fault"),
+    }
+
+
+def _shipping_information(job):
+    address = job["shipping_address"]
+    dates = job["estimated_shipping_dates"] or {}
+    return {
+        "city": address["city"],
+        "country_code": address["country_code"],
+        "country": address["country_code"],
+        "level": job["shipping_level"],
+        "email": address["email"],
+        "is_business": address["is_business"],
+        "name": address.get("name"),
+        "organization": address.get("organization"),
+        "phone_number": address["phone_number"],
+        "postcode": address["postcode"],
+        "state_code": address["state_code"],
+        "state": address["state_code"],
+        "street1": address["street1"],
+        "street2": address.get("street2"),
+        "title": address.get("title"),
+        "arrival_max": dates.get("arrival_max"),
+        "arrival_min": dates.get("arrival_min"),
+        "dispatch_max": dates.get("dispatch_max"),
+        "dispatch_min": dates.get("dispatch_min"),
+        "recipient_tax_id": address.get("recipient_tax_id"),
+        "warnings": address.get("warnings"),
+        "suggested_address": address.get("suggested_address"),
+    }
+
+
+def _cost_information(job):
+    costs = job["costs"]
+    return {
+        "currency": costs["currency"],
+        "total_cost_excl_tax": costs["total_cost_excl_tax"],
+        "total_cost_incl_tax": costs["total_cost_incl_tax"],
+        "total_tax": costs["total_tax"],
+        "shipping_cost": costs["shipping_cost"],
+        "fulfillment_cost": costs["fulfillment_cost"],
+        "line_item_costs": costs["line_item_costs"],
+    }
+
+
+# Each field of the simple dictionary, in the same order as convert_print_job(), mapped to the function that works it out.
+_LINE_ITEM_FIELDS = {
+    "id": lambda item: item["id"],
+    "printable_id": lambda item: item["printable_id"],
+    "external_id": lambda item: item["external_id"],
+    "quantity": lambda item: item["quantity"],
+    "title": lambda item: item["title"],
+    "status": lambda item: item["status"]["name"],
+    "tracking_urls": lambda item: _messages(item).get("tracking_urls"),
+    "tracking_id": lambda item: _messages(item).get("tracking_id"),
+    "carrier_name": lambda item: _messages(item).get("carrier_name"),
+    "status_info": _status_info,
+    "print_information": lambda item: {
+        "cover": _print_file(item, "cover"),
+        "interior": _print_file(item, "interior"),
+    },
+    "reprint_info": _reprint_info,
+}
+
+_PRINT_JOB_FIELDS = {
+    "id": lambda job: job["id"],
+    "external_id": lambda job: job["external_id"],
+    "line_items": lambda job: [LineItem(item) for item in job["line_items"]],
+    "child_job_ids": lambda job: job.get("child_job_ids"),
+    "parent_job_id": lambda job: job.get("parent_job_id"),
+    "date_created": lambda job: job.get("date_created"),
+    "date_modified": lambda job: job.get("date_modified"),
+    "contact_email": lambda job: job["contact_email"],
+    "order_id": lambda job: job.get("order_id"),
+    "production_delay": lambda job: job.get("production_delay"),
+    "production_due_time": lambda job: job.get("production_due_time"),
+    "shipping_information": _shipping_information,
+    "cost_information": _cost_information,
+}
+
+
+class _View(Mapping):
+    __slots__ = ("raw",)
+    _fields = {}
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __getitem__(self, key):
+        try:
+            field = self._fields[key]
+        except KeyError:
+            raise KeyError(key) from None
+        return field(self.raw)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={self.raw.get('id')!r})"
+
+
+class LineItem(_View):
+    __slots__ = ()
+    _fields = _LINE_ITEM_FIELDS
+
+    def to_dict(self):
+        return {key: field(self.raw) for key, field in self._fields.items()}
+
+
+class PrintJob(_View):
+    __slots__ = ()
+    _fields = _PRINT_JOB_FIELDS
+
+    def to_dict(self):
+        print_job = {key: field(self.raw) for key, field in self._fields.items()}
+        print_job["line_items"] = [line_item.to_dict() for line_item in print_job["line_items"]]
+        return print_job
@@ -0,0 +1,258 @@
+"""
+- Beaux Blanchard
+- Mission Control LLC
+- Webhook Receiver
+
+Receives the webhooks set up with subscribe_to_webhooks(), so print-jobs can be followed as Lulu changes them instead of
+polling get_print_job_status() for every open print-job. It is a small HTTP server on asyncio, with nothing to install.
+Each PRINT_JOB_STATUS_CHANGED delivery is turned into the same master dictionary convert_print_job() returns, and passed
+to every handler you add.
+
+    receiver = WebhookReceiver(port=8080, secret=CLIENT_SECRET)
+
+    @receiver.handler
+    async def on_status_changed(print_job):
+        print(print_job["id"], print_job["line_items"][0]["status"])
+
+    receiver.run()    # Or, inside a running event loop: await receiver.start()
+
+    subscribe_to_webhooks(["PRINT_JOB_STATUS_CHANGED"], "https://your.server/lulu-webhook")
+
+WebhookReceiver(host="0.0.0.0", port=8080, path="/", secret=None, max_queue=1000, put_timeout=1, lazy=False, store=None):
+    host: (string) The address to listen on
+    port: (integer) The port to listen on
+    path: (string) Only deliveries to this path are accepted. None accepts any path.
+    secret: (string) Your API client secret. If given, every delivery must carry a valid Lulu-HMAC-SHA256 signature,
+            proving it came from Lulu. Deliveries without one are refused.
+    max_queue: (integer) How many print-jobs each handler can have waiting before new deliveries are refused
+    put_timeout: (number) Seconds a delivery waits for room in a full queue before it is refused
+    lazy: (boolean) Hand the handlers PrintJob views (see lulu_views.py) instead of dictionaries
+    store: (EventStore) If given, PRINT_JOB_STATUS_CHANGED deliveries go through this store (see lulu_events.py) first,
+           and only real status transitions reach the handlers. Duplicate and out-of-order deliveries are answered 200
+           and dropped.
+
+    handler(function, max_queue=None): Adds a handler, and returns it so it can be used as a decorator. The handler is
+        called with each print-job, one at a time, in the order they arrived. It can be an async function, or a normal
+        function, which is run in a thread so it doesn't hold up the server.
+
+    start(): (async) Starts the server and the handlers
+    close(): (async) Stops accepting deliveries, finishes the print-jobs already queued, and stops
+    run(): Starts the server and blocks until it is interrupted
+
+    dispatch(body, signature=None): (async) Handles one delivery and returns the HTTP status code to answer with. Use
+        this to receive webhooks in a web framework you already run, instead of the built-in server.
+        body: (bytes) The body of the request
+        signature: (string) The Lulu-HMAC-SHA256 header of the request
+
+    stats(): Returns a dictionary with the number of deliveries "received", "accepted", "rejected" (bad signature or
+        body), "refused" (queues full), "ignored" (dropped by the store), and print-jobs "handled" and "failed" (the
+        handler raised an error).
+
+Every handler has its own bounded queue. A delivery is answered 200 once every handler's queue has taken it, which is
+before the handlers run. If a queue stays full for put_timeout seconds, the delivery is answered 503. Lulu then sends it
+again later, so a slow handler slows Lulu down instead of filling memory. An error in a handler is printed and the handler
+moves on to the next print-job.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import inspect
+import traceback
+
+import LuluAPI.lulu_codec as codec
+import LuluAPI.request as request
+from LuluAPI.lulu_views import PrintJob
+
+SIGNATURE_HEADER = "lulu-hmac-sha256"
+STATUS_CHANGED = "PRINT_JOB_STATUS_CHANGED"
+
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+            411: "Length Required", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+class WebhookReceiver:
+    def __init__(self, host="0.0.0.0", port=8080, path="/", secret=None, max_queue=1000, put_timeout=1, lazy=False,
+                 store=None):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout
+        self.lazy = lazy
+        self.store = store
+        self.received = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.refused = 0
+        self.ignored = 0
+        self.handled = 0
+        self.failed = 0
+        # Each handler as (function, max_queue). Once started, each has a queue and a task working through it.
+        self._handlers = []
+        self._queues = []
+        self._workers = []
+        self._server = None
+
+    def handler(self, function, max_queue=None):
+        self._handlers.append((function, max_queue or self.max_queue))
+        return function
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "refused": self.refused,
+            "ignored": self.ignored,
+            "handled": self.handled,
+            "failed": self.failed,
+        }
+
+    async def start(self):
+        # The queues are made here, inside the event loop they belong to.
+        self._queues = [asyncio.Queue(max_queue) for _, max_queue in self._handlers]
+        self._workers = [asyncio.create_task(self._work(function, queue))
+                         for (function, _), queue in zip(self._handlers, self._queues)]
+        self._server = await asyncio.start_server(self._serve, self.host, self.port, limit=MAX_HEADER_SIZE)
+        # With port=0 the system picks a free port.
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for queue in self._queues:
+            await queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def run(self):
+        async def main():
+            await self.start()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await self.close()
+
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            pass
+
+    async def _work(self, function, queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            print_job = await queue.get()
+            try:
+                if inspect.iscoroutinefunction(function):
+                    await function(print_job)
+                else:
+                    await loop.run_in_executor(None, function, print_job)
+                self.handled += 1
+            except Exception:
+                self.failed += 1
+                traceback.print_exc()
+            finally:
+                queue.task_done()
+
+    def _signature_is_valid(self, body, signature):
+        if self.secret is None:
+            return True
+        if not signature:
+            return False
+        expected = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature.strip().lower())
+
+    async def dispatch(self, body, signature=None):
+        self.received += 1
+        if not self._signature_is_valid(body, signature):
+            self.rejected += 1
+            return 401
+        try:
+            delivery = codec.loads(body)
+            topic = delivery.get("topic")
+            data = delivery["data"]
+            if topic == STATUS_CHANGED:
+                # Neither shape keeps the print-job's own status, which the store needs to spot a transition.
+                status = (data.get("status") or {}).get("name")
+                print_job = PrintJob(data) if self.lazy else request.convert_print_job(data)
+            else:
+                # Other topics are passed on as Lulu sent them.
+                print_job = data
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.rejected += 1
+            return 400
+
+        transition = None
+        if self.store is not None and topic == STATUS_CHANGED:
+            transition = self.store.update(print_job, status)
+            if transition is None:
+                # A duplicate or out-of-date delivery. Lulu is told it arrived, so it isn't sent again.
+                self.ignored += 1
+                return 200
+
+        for queue in self._queues:
+            try:
+                await asyncio.wait_for(queue.put(print_job), self.put_timeout)
+            except asyncio.TimeoutError:
+                # Handlers whose queue already took the print-job still get it. When Lulu sends it again they get
+                # it a second time, which a handler must put up with anyway, since Lulu can send any delivery twice.
+                if transition is not None:
+                    # Otherwise the store would drop the next delivery as a duplicate.
+                    self.store.rollback(transition)
+                self.refused += 1
+                return 503
+        self.accepted += 1
+        return 200
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                method, _, target = request_line.partition(" ")
+                target = target.rsplit(" ", 1)[0]
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                if "content-length" not in headers:
+                    status = 411 if method == "POST" else 405
+                    keep_alive = False
+                else:
+                    length = int(headers["content-length"])
+                    if length > MAX_BODY_SIZE:
+                        status = 413
+                        keep_alive = False
+                    else:
+                        body = await reader.readexactly(length)
+                        if method != "POST":
+                            status = 405
+                        elif self.path is not None and target.split("?", 1)[0] != self.path:
+                            status = 404
+                        else:
+                            status = await self.dispatch(body, headers.get(SIGNATURE_HEADER))
+
+                writer.write(f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Length: 0\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode())
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            return
+        finally:
+            writer.close()
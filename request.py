@@ -11,6 +11,19 @@ NOTES:
     - Lulu supports all instances of "line_items" to be named "items". Whichever name you give will be the name you receive.
     - There a few functions with the lulu_ prefix. These functions have an alternate form without that prefix that uses a simple, universal dictionary
       in an attempt to make the developer's life easier. Details are below the remainder of the original documentation.
+    - Every function sends its request through the shared, kept-alive session in lulu_session.py. Call lulu_session.configure()
+      before making requests if you need a larger connection pool than the default of 10 connections per host.
+    - Requests are paced and retried by lulu_ratelimit.py. A 429 (Too Many Requests) response is retried after the wait Lulu asks for,
+      and fewer requests are sent at once until Lulu stops throttling. Call lulu_ratelimit.configure() to set a requests-per-second limit.
+    - Request bodies and responses are encoded and decoded by lulu_codec.py, which uses orjson or ujson when one is installed.
+    - Importing this module does not contact Lulu. The authentication token is fetched by the first function that sends a request.
+    - Every request goes to URLPREFIX, which is Lulu's sandbox or live API depending on SANDBOX in lulu_token.py. To use another server with
+      the same API (such as the local stand-in in benchmarks/fake_lulu.py), set the LULU_URLPREFIX environment variable before importing,
+      or call set_url_prefix(url_prefix) at any time.
+    - Like Lulu's API itself, the functions return Lulu's error response (such as {"detail": ...}) instead of raising. The functions that
+      take raise_for_status=True raise a LuluHTTPError for any response outside 2xx instead. Its status_code and response attributes
+      hold the HTTP status and Lulu's error response, and its rejected attribute is True for a 4xx other than 408 or 429, where sending
+      the same request again would fail the same way.
 
 =======
 
@@ -159,7 +172,7 @@ calculate_print_job_cost(line_items, shipping_address, shipping_option): Returns
 
 
 # This function searches through and returns all of your print-jobs. You can narrow down the search by the criteria given in filters.
-lulu_get_print_jobs(filters): Returns a JSON response from Lulu about all print-jobs, based on the filter criteria given
+lulu_get_print_jobs(filters, raise_for_status): Returns a JSON response from Lulu about all print-jobs, based on the filter criteria given
     filters: (dictionary) A dictionary containing any search filters you would like to use on the response file.
         Format of dictionary (none of the parameters are required, passing nothing into this function will return all print-jobs)
         {
@@ -176,6 +189,7 @@ lulu_get_print_jobs(filters): Returns a JSON response from Lulu about all print-
             search: (string) Search across the fields id, external_id, order_id, status, line_item_id, line_item_external_id, line_item_title, line_item_tracking_id and shipping_address. (Will return any print-job where the item put into this field appears in any of the listed fields)
             ordering: (string) Which field to use when ordering the results. (e.g. putting date_created will order the results by date created)
         }
+    raise_for_status: (boolean) Raise a LuluHTTPError instead of returning an error response (see NOTES)
 
     The JSON response contains (all required):
     {
@@ -321,7 +335,7 @@ lulu_get_print_jobs(filters): Returns a JSON response from Lulu about all print-
 
 
 # Use this function to send a print-job for Lulu to execute.
-lulu_create_print_job(line_items, shipping_address, shipping_level, contact_email, external_id, production_delay): Sends a print-job for Lulu to execute. When you create a print-job, it will remain in the "UNPAID" state until manually paid for on the developer website. Alternatively, you can attach a credit card on file, which will be charged automatically and move the print-job to the next phase.
+lulu_create_print_job(line_items, shipping_address, shipping_level, contact_email, external_id, production_delay, raise_for_status): Sends a print-job for Lulu to execute. When you create a print-job, it will remain in the "UNPAID" state until manually paid for on the developer website. Alternatively, you can attach a credit card on file, which will be charged automatically and move the print-job to the next phase.
     line_items: (list of dictionaries) (required) The list of items that you want to have printed.
         Each dictionary contains:
             To tell Lulu what you want to print, there are three different options:
@@ -374,6 +388,7 @@ lulu_create_print_job(line_items, shipping_address, shipping_level, contact_emai
     contact_email: (string) (required) The contact email that you want to use for the print-job. This is Lulu uses to ask questions if there is something they need to ask about the print-job. This should not be the end-customer email, but instead you, the developer/distributor placing the print-job order.
     external_id: (string) An arbitrary string that the developer can use to help identify print-jobs on their end. Lulu does not use this ID, but will store and return this ID with it's associated print-job.
     production_delay: (integer between 60 and 2880) Lulu places an artificial delay between being sent the order and beginning the printing process, in the event of delays. It is automatically set to 60 (1 hour), but can be set from anywhere between 60 (1 hour) and 2880 (48 hours).
+    raise_for_status: (boolean) Raise a LuluHTTPError instead of returning an error response (see NOTES)
 
     The JSON response contains:
     {
@@ -522,9 +537,29 @@ get_print_job_statistics(filters): Get the number of print-jobs that fall under
     }
 
 
+# get_print_job_statistics() counts one status per request. This function counts many statuses at once, with the
+# requests sent in parallel, for example to fill in an operations dashboard in the time of a single request.
+get_print_job_statistics_by_status(statuses, filters, max_workers): Returns a dictionary of each status to the number of print-jobs in it
+    statuses: (list of strings) The statuses to count. Defaults to every status in PRINT_JOB_STATUSES.
+    filters: (dictionary) Identical to get_print_job_statistics(), but without "status". These filters apply to every status.
+    max_workers: (integer) The number of requests sent at once
+
+    The dictionary looks like:
+    {
+        "UNPAID": 3,
+        "IN_PRODUCTION": 17,
+        ...
+    }
+    If Lulu answers with an error for a status, its count is None.
+
+    lulu_cache.get_print_job_statistics_by_status() is the same, but remembers the counts for a few seconds, so that a
+    dashboard open in many places at once only asks Lulu once.
+
+
 # This function gives a singular print-job object that corresponds to a given ID.
-lulu_get_single_print_job(id): Retrieve the information about a singular print-job based on id number
+lulu_get_single_print_job(id, raise_for_status=False): Retrieve the information about a singular print-job based on id number
     id: (string) The print-job id
+    raise_for_status: (boolean) Raise a LuluHTTPError instead of returning an error response (see NOTES)
 
     The JSON response is very similar to an individual response in get_print_jobs(), with several additional fields, and several removed, as follows:
     {
@@ -673,8 +708,9 @@ lulu_get_single_print_job(id): Retrieve the information about a singular print-j
 
 # This function gets the "cost" field of a print-job and returns it. You could simply use get_print_job() and retrieve the
 # cost information from there, but I believe this option is given by Lulu so that the size of the package being sent is smaller.
-get_print_job_costs(id): Return only the "cost" dictionary of a single print-job
+get_print_job_cost(id, raise_for_status=False): Return only the "cost" dictionary of a single print-job
     id: (string) (required) The id of the print-job to retrieve the cost from
+    raise_for_status: (boolean) Raise a LuluHTTPError instead of returning an error response (see NOTES)
 
     The JSON response is identical to the "cost" field of the response in get_single_print_job()
 
@@ -685,8 +721,9 @@ get_print_job_costs(id): Return only the "cost" dictionary of a single print-job
 
 
 # Similarly to get_print_job_costs, this function only returns the "status" of a print-job corresponding to an ID.
-get_print_job_status(id): Return status information about a single print-job
+get_print_job_status(id, raise_for_status=False): Return status information about a single print-job
     id: (string) (required) The id of the print-job to retrieve the status information from
+    raise_for_status: (boolean) Raise a LuluHTTPError instead of returning an error response (see NOTES)
 
     The JSON response contains:
     {
@@ -1062,43 +1099,136 @@ create_print_job(input_dictionary):
     You receive a simple dictionary in return.
     
 
-get_print_jobs(filters):
+get_print_jobs(filters, lazy):
     filters is identical to the lulu_get_print_jobs function
+    lazy: (boolean) (default = False) If True, each entry in results is a read-only PrintJob view (see lulu_views.py) instead of a dictionary.
+          A view has the same keys and values, but only works out a field when you read it, which is much faster when you only need a few fields.
     
     The return dictionary is identical to lulu_get_print_jobs, but each entry in results is in the simplified form.
     
-get_print_jobs(id): 
+get_single_print_job(id, lazy, raise_for_status): 
     id: (string) (required) The id of the print-job
+    lazy: (boolean) (default = False) Identical to get_print_jobs
+    raise_for_status: (boolean) (default = False) Identical to lulu_get_single_print_job
     
     You receive a simple dictionary in return.
 
+iter_print_jobs(filters, convert, lazy):
+    filters: (dictionary) Identical to the lulu_get_print_jobs function. "page" and "page_size" choose where to start and how many print-jobs are fetched per request.
+    convert: (boolean) (default = True) If False, the print-jobs are yielded exactly as Lulu sent them
+    lazy: (boolean) (default = False) Identical to get_print_jobs
+
+    A generator that yields every print-job matching the filters, one at a time, in simple dictionary form. It follows the "next" link of each page,
+    and downloads the next page in the background while you work through the current one. No more than two pages are held in memory at once,
+    no matter how many print-jobs the account has. Stopping early (for example with break) stops the downloads. If Lulu answers a page with
+    an error, a LuluHTTPError is raised where that page would have started.
+
+        for print_job in iter_print_jobs({"status": "SHIPPED", "page_size": 100}):
+            ...
+
+fetch_all_print_jobs(filters, page_size, max_workers, convert, lazy):
+    filters: (dictionary) Identical to the lulu_get_print_jobs function, except that "page" and "page_size" are ignored
+    page_size: (integer) (default = 100) The number of print-jobs to fetch per request
+    max_workers: (integer) (default = 8) The number of pages to fetch at the same time
+    convert: (boolean) (default = True) If False, the print-jobs are returned exactly as Lulu sent them
+    lazy: (boolean) (default = False) Identical to get_print_jobs
+
+    Fetches every print-job matching the filters. The first page gives the total count, and the remaining pages are then fetched in parallel.
+    Print-jobs that moved between pages during the scan and showed up twice are only returned once. Print-jobs created during the scan
+    can shift others between pages; ordering by a field that new print-jobs don't change, such as {"ordering": "id"}, avoids this.
+    If any page fails, its LuluHTTPError is raised. If fewer print-jobs were gathered than the count Lulu gave on the first page (print-jobs
+    left the filters during the scan, for example), an IncompleteScanError is raised instead of returning a partial list.
+
+    The return dictionary contains:
+    {
+        count: (integer) The number of print-jobs returned
+        pages: (integer) The number of pages fetched
+        duplicates: (integer) The number of repeated print-jobs that were dropped
+        elapsed: (float) The number of seconds the scan took
+        jobs_per_second: (float) The throughput of the scan
+        results: (list of dictionaries) The print-jobs, in the order Lulu returned them
+    }
+
 """
 
 
-import requests
 import LuluAPI.lulu_token as token
-import json
+import LuluAPI.lulu_session as session
+import LuluAPI.lulu_codec as codec
+import LuluAPI.lulu_ratelimit as ratelimit
+from LuluAPI.lulu_views import PrintJob
+import time
 
 SANDBOX = token.SANDBOX
 
-if SANDBOX:
-    URLPREFIX = "https://api.sandbox.lulu.com/"
-else:
-    URLPREFIX = "https://api.lulu.com/"
+# Follows the SANDBOX setting in lulu_token.py, unless the LULU_URLPREFIX environment variable is set.
+URLPREFIX = token.URLPREFIX
 
-auth_key = token.get_token()
+PRINT_JOB_STATUSES = ("CREATED", "UNPAID", "PAYMENT_IN_PROGRESS", "PRODUCTION_READY", "PRODUCTION_DELAYED", "IN_PRODUCTION",
+                      "ERROR", "SHIPPED", "CANCELED", "REJECTED")
 
+# The Authorization header is added by _send() on every call, so that an expired token is never reused.
 post_headers = {
-    "Authorization": f"Bearer {auth_key}",
     "Cache-Control": "no-cache",
     "Content-Type": "application/json"
 }
 
 get_headers = {
-    "Authorization": f"Bearer {auth_key}",
     "Cache-Control": "no-cache",
 }
 
+
+# Points every function, and the token requests, at another server with Lulu's API.
+def set_url_prefix(url_prefix):
+    global URLPREFIX
+    token.set_url_prefix(url_prefix)
+    URLPREFIX = token.URLPREFIX
+
+# Raised instead of returning Lulu's error response, by the functions called with raise_for_status.
+class LuluHTTPError(Exception):
+    def __init__(self, status_code, response):
+        super().__init__(f"Lulu answered {status_code}: {response}")
+        self.status_code = status_code
+        self.response = response
+
+    # 408 (Request Timeout) and 429 (Too Many Requests) are 4xx responses, but the same request can succeed later.
+    @property
+    def rejected(self):
+        return 400 <= self.status_code < 500 and self.status_code not in (408, 429)
+
+# Raised by fetch_all_print_jobs() when it gathered fewer print-jobs than the count Lulu gave on the first page.
+class IncompleteScanError(Exception):
+    def __init__(self, count, fetched):
+        super().__init__(f"Lulu counted {count} print-jobs, but only {fetched} were fetched")
+        self.count = count
+        self.fetched = fetched
+
+# Decodes a response. With raise_for_status, a response outside 2xx raises a LuluHTTPError instead of being returned,
+# including one that isn't JSON, such as a proxy's error page.
+def _decode(response, raise_for_status=False):
+    if not raise_for_status or 200 <= response.status_code < 300:
+        return codec.loads(response.content)
+    try:
+        body = codec.loads(response.content)
+    except ValueError:
+        body = response.content
+    raise LuluHTTPError(response.status_code, body)
+
+# Sends a request within the limits set in lulu_ratelimit.py, which also retries it if Lulu is throttling.
+def _send(method, url, headers, **kwargs):
+    return ratelimit.send(method, url, lambda: _send_authorized(method, url, headers, **kwargs))
+
+# Sends a request with the current token. If Lulu rejects the token (it expired early or was revoked), a new token is
+# fetched and the request is sent one more time.
+def _send_authorized(method, url, headers, **kwargs):
+    auth_key = token.get_token()
+    response = session.request(method, url, headers={**headers, "Authorization": f"Bearer {auth_key}"}, **kwargs)
+    if response.status_code == 401:
+        token.invalidate_token(auth_key)
+        auth_key = token.get_token()
+        response = session.request(method, url, headers={**headers, "Authorization": f"Bearer {auth_key}"}, **kwargs)
+    return response
+
 # This function takes a dictionary from Lulu from either the get_print_job() or get_print_jobs() function.
 # Since the response schema is different for create_print_job, this function won't work on that.
 def convert_print_job(lulu_dictionary):
@@ -1209,62 +1339,149 @@ def make_sku_id(gloss):
     return pod_package_id
 
 def post_interior_file_validation(link, pod_package_id=""):
-    payload = json.dumps({
+    payload = codec.dumps({
         "source_url": link,
         "pod_package_id": pod_package_id
     })
     url = f"{URLPREFIX}validate-interior/"
-    response = requests.request("POST", url, headers=post_headers, data=payload)
-    return response.json()
+    response = _send("POST", url, post_headers, data=payload)
+    return codec.loads(response.content)
 
 def get_interior_file_validation(id):
     url = f"{URLPREFIX}validate-interior/{id}"
     payload = {}
-    response = requests.request("GET", url, headers=get_headers, data=payload)
-    return response.json()
+    response = _send("GET", url, get_headers, data=payload)
+    return codec.loads(response.content)
 
 def post_cover_file_validation(link, pod_package_id, interior_page_count):
     url = f"{URLPREFIX}validate-cover/"
-    payload = json.dumps({
+    payload = codec.dumps({
         "source_url": link,
         "pod_package_id": pod_package_id,
         "interior_page_count": interior_page_count
     })
-    response = requests.request("POST", url, headers=post_headers, data=payload)
-    return response.json()
+    response = _send("POST", url, post_headers, data=payload)
+    return codec.loads(response.content)
 
 def get_cover_file_validation(id):
     url = f"{URLPREFIX}validate-cover/{id}"
     payload = {}
-    response = requests.request("GET", url, headers=get_headers, data=payload)
-    return response.json()
+    response = _send("GET", url, get_headers, data=payload)
+    return codec.loads(response.content)
 
 def calculate_print_job_cost(line_items, shipping_address, shipping_option):
     url = f"{URLPREFIX}print-job-cost-calculations/"
-    payload = json.dumps({
+    payload = codec.dumps({
         "line_items": line_items,
         "shipping_address": shipping_address,
         "shipping_option": shipping_option
     })
-    response = requests.request("POST", url, headers=post_headers, data=payload)
-    return response.json()
+    response = _send("POST", url, post_headers, data=payload)
+    return codec.loads(response.content)
 
-def get_print_jobs(filters=None):
+def get_print_jobs(filters=None, lazy=False):
     lulu_response = lulu_get_print_jobs(filters)
     for index, item in enumerate(lulu_response["results"]):
-        lulu_response["results"][index] = convert_print_job(item)
+        lulu_response["results"][index] = _convert(item, lazy)
     return lulu_response
 
-def lulu_get_print_jobs(filters=None):
+# lazy=True wraps the print-job in a PrintJob view, which works out each field only when it is read.
+def _convert(item, lazy):
+    if lazy:
+        return PrintJob(item)
+    return convert_print_job(item)
+
+def lulu_get_print_jobs(filters=None, raise_for_status=False):
     url = f"{URLPREFIX}print-jobs/"
     payload = {}
     if filters is None:
         filters = {}
-    response = requests.request("GET", url, headers=get_headers, data=payload, params=filters)
-    return response.json()
+    response = _send("GET", url, get_headers, data=payload, params=filters)
+    return _decode(response, raise_for_status)
+
+# Follows the "next" links of lulu_get_print_jobs() and yields the print-jobs one at a time. The next page is downloaded in
+# a background thread while the current one is being consumed, so at most two pages are held in memory at once.
+def iter_print_jobs(filters=None, convert=True, lazy=False):
+    # Imported here because concurrent.futures takes longer to import than the rest of this module.
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # A page that fails raises a LuluHTTPError, instead of ending the iteration as if it were the last page.
+        next_page = executor.submit(lulu_get_print_jobs, filters, True)
+        while next_page is not None:
+            page = next_page.result()
+            next_url = page.get("next")
+            next_page = executor.submit(_get_page, next_url) if next_url else None
+            results = page["results"]
+            # Drop the page itself so only its results are kept alive while they are yielded.
+            page = None
+            for item in results:
+                yield _convert(item, lazy) if convert else item
+
+# Fetches every page of lulu_get_print_jobs() at once instead of one after the other. The first page tells us the total
+# count, which gives the number of pages, and the rest are fetched in parallel by a pool of max_workers threads.
+def fetch_all_print_jobs(filters=None, page_size=100, max_workers=8, convert=True, lazy=False):
+    from concurrent.futures import ThreadPoolExecutor
+
+    start = time.perf_counter()
+    filters = dict(filters or {})
+    filters["page_size"] = page_size
+    filters.pop("page", None)
+
+    first_page = lulu_get_print_jobs({**filters, "page": 1}, raise_for_status=True)
+    page_count = -(-first_page["count"] // page_size)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # map() returns the pages in page order, whatever order they finish in, and raises the first page's error.
+        other_pages = executor.map(lambda page: _get_numbered_page(filters, page), range(2, page_count + 1))
+        pages = [first_page, *other_pages]
+
+    # Print-jobs created or deleted during the scan shift the rest of the pages, so the same print-job can show up at the
+    # end of one page and the start of the next. Only the first copy is kept.
+    results = []
+    seen_ids = set()
+    duplicates = 0
+    for page in pages:
+        for item in page["results"]:
+            if item["id"] in seen_ids:
+                duplicates += 1
+                continue
+            seen_ids.add(item["id"])
+            results.append(_convert(item, lazy) if convert else item)
+    # More than the count is fine (print-jobs created during the scan), but fewer means some were missed.
+    if len(results) < first_page["count"]:
+        raise IncompleteScanError(first_page["count"], len(results))
+
+    elapsed = time.perf_counter() - start
+    return {
+        "count": len(results),
+        "pages": page_count,
+        "duplicates": duplicates,
+        "elapsed": elapsed,
+        "jobs_per_second": len(results) / elapsed if elapsed else 0.0,
+        "results": results,
+    }
+
+def _get_numbered_page(filters, page):
+    try:
+        return lulu_get_print_jobs({**filters, "page": page}, raise_for_status=True)
+    except LuluHTTPError as error:
+        # A page past the end, if print-jobs left the filters during the scan. Lulu answers 404 {"detail": "Invalid page."}.
+        if error.status_code == 404:
+            return {"results": []}
+        raise
+
+def _get_page(url):
+    response = _send("GET", url, get_headers)
+    return _decode(response, raise_for_status=True)
 
 def create_print_job(input_info):
     lulu_dictionary = lulu_create_print_job(input_info["line_items"], input_info["shipping_information"], input_info["shipping_information"]["level"], input_info["shipping_information"]["email"], input_info["external_id"], input_info["production_delay"])
+    return convert_created_print_job(input_info, lulu_dictionary)
+
+# This function takes the master dictionary given to create_print_job() and the response from lulu_create_print_job(),
+# and combines them into a master dictionary. The response schema of lulu_create_print_job() is different from
+# get_print_jobs(), which is why convert_print_job() can't be used here.
+def convert_created_print_job(input_info, lulu_dictionary):
     new_shipping_information = input_info["shipping_information"]
     new_shipping_information["warnings"] = lulu_dictionary["shipping_address"]["warnings"]
     new_shipping_information["suggested_address"] = lulu_dictionary["shipping_address"]["suggested_address"]
@@ -1345,9 +1562,9 @@ def create_print_job(input_info):
     }
     return return_dictionary
 
-def lulu_create_print_job(line_items, shipping_address, shipping_level, contact_email, external_id="", production_delay=60):
+def lulu_create_print_job(line_items, shipping_address, shipping_level, contact_email, external_id="", production_delay=60, raise_for_status=False):
     url = f"{URLPREFIX}print-jobs/"
-    payload = json.dumps({
+    payload = codec.dumps({
         "line_items": line_items,
         "shipping_address": shipping_address,
         "shipping_level": shipping_level,
@@ -1355,77 +1572,87 @@ def lulu_create_print_job(line_items, shipping_address, shipping_level, contact_
         "external_id": external_id,
         "production_delay": production_delay
     })
-    response = requests.request("POST", url, headers=post_headers, data=payload)
-    return response.json()
+    response = _send("POST", url, post_headers, data=payload)
+    return _decode(response, raise_for_status)
 
 def get_print_job_statistics(filters=None):
     url = f"{URLPREFIX}print-jobs/statistics/"
     payload = {}
     if filters is None:
         filters = {}
-    response = requests.request("GET", url, headers=get_headers, data=payload, params=filters)
-    return response.json()
+    response = _send("GET", url, get_headers, data=payload, params=filters)
+    return codec.loads(response.content)
+
+# Sends one get_print_job_statistics() request for each status, all at once.
+def get_print_job_statistics_by_status(statuses=None, filters=None, max_workers=10):
+    from concurrent.futures import ThreadPoolExecutor
+
+    statuses = list(statuses or PRINT_JOB_STATUSES)
+    filters = dict(filters or {})
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(statuses)))) as executor:
+        responses = executor.map(lambda status: get_print_job_statistics({**filters, "status": status}), statuses)
+        return {status: response.get("count") for status, response in zip(statuses, responses)}
 
-def get_single_print_job(id):
-    lulu_dictionary = lulu_get_single_print_job(id)
-    return convert_print_job(lulu_dictionary)
+def get_single_print_job(id, lazy=False, raise_for_status=False):
+    lulu_dictionary = lulu_get_single_print_job(id, raise_for_status)
+    return _convert(lulu_dictionary, lazy)
 
-def lulu_get_single_print_job(id):
+def lulu_get_single_print_job(id, raise_for_status=False):
     url = f"{URLPREFIX}print-jobs/{id}/"
     payload = {}
-    response = requests.request("GET", url, headers=get_headers, data=payload)
-    return response.json()
+    response = _send("GET", url, get_headers, data=payload)
+    return _decode(response, raise_for_status)
 
-def get_print_job_cost(id):
+def get_print_job_cost(id, raise_for_status=False):
     url = f"{URLPREFIX}print-jobs/{id}/costs/"
     payload = {}
-    response = requests.request("GET", url, headers=get_headers, data=payload)
-    return response.json()
+    response = _send("GET", url, get_headers, data=payload)
+    return _decode(response, raise_for_status)
 
-def get_print_job_status(id):
+def get_print_job_status(id, raise_for_status=False):
     url = f"{URLPREFIX}print-jobs/{id}/status/"
     payload = {}
-    response = requests.request("GET", url, headers=get_headers, data=payload)
-    return response.json()
+    response = _send("GET", url, get_headers, data=payload)
+    return _decode(response, raise_for_status)
 
 def cancel_print_job(id):
     url = f"{URLPREFIX}print-jobs/{id}/status/"
-    payload = json.dumps({
+    payload = codec.dumps({
         "name": "CANCELED"
     })
-    response = requests.request("PUT", url, headers=post_headers, data=payload)
-    return response.json()
+    response = _send("PUT", url, post_headers, data=payload)
+    return codec.loads(response.content)
 
 def retrieve_shipping_options(line_items, shipping_address, currency="USD"):
     url = f"{URLPREFIX}shipping-options/"
-    payload = json.dumps({
+    payload = codec.dumps({
         "line_items": line_items,
         "shipping_address": shipping_address,
         "currency": currency
     })
-    response = requests.request("POST", url, headers=post_headers, data=payload)
-    return response.json()
+    response = _send("POST", url, post_headers, data=payload)
+    return codec.loads(response.content)
 
 def subscribe_to_webhooks(topics, destination_url):
     url = f"{URLPREFIX}webhooks/"
-    payload = json.dumps({
+    payload = codec.dumps({
         "topics": topics,
         "url": destination_url
     })
-    response = requests.request("POST", url, headers=post_headers, data=payload)
-    return response.json()
+    response = _send("POST", url, post_headers, data=payload)
+    return codec.loads(response.content)
 
 def get_webhooks():
     url = f"{URLPREFIX}webhooks/"
     payload = {}
-    response = requests.request("GET", url, headers=get_headers, data=payload)
-    return response.json()
+    response = _send("GET", url, get_headers, data=payload)
+    return codec.loads(response.content)
 
 def get_single_webhook(id):
     url = f"{URLPREFIX}webhooks/{id}/"
     payload = {}
-    response = requests.request("GET", url, headers=get_headers, data=payload)
-    return response.json()
+    response = _send("GET", url, get_headers, data=payload)
+    return codec.loads(response.content)
 
 def update_webhook(id, topics=None, destination_url=None, is_active=None):
     url = f"{URLPREFIX}webhooks/{id}/"
@@ -1436,27 +1663,28 @@ def update_webhook(id, topics=None, destination_url=None, is_active=None):
         payload["url"] = destination_url
     if is_active is not None:
         payload["is_active"] = is_active
-    response = requests.request("PATCH", url, headers=post_headers, json=payload)
-    return response.json()
+    response = _send("PATCH", url, post_headers, data=codec.dumps(payload))
+    return codec.loads(response.content)
 
 def delete_webhook(id):
     url = f"{URLPREFIX}webhooks/{id}/"
     payload = {}
-    response = requests.request("DELETE", url, headers=get_headers, data=payload)
-    return response.json()
+    response = _send("DELETE", url, get_headers, data=payload)
+    return codec.loads(response.content)
 
 def test_webhook(id, topic):
     url = f"{URLPREFIX}webhooks/{id}/test-submission/{topic}"
     payload = {}
-    response = requests.request("POST", url, headers=get_headers, data=payload)
+    response = _send("POST", url, get_headers, data=payload)
     try:
-        return response.json()
-    except requests.exceptions.JSONDecodeError:
+        return codec.loads(response.content)
+    # codec.loads() raises a ValueError (orjson's JSONDecodeError, or json's) when the body is not JSON.
+    except ValueError:
         return None
 
 def get_webhook_submissions(page=1, page_size=100, created_after=None, created_before=None, is_success=None, response_code=None, webhook_id=None):
     url = f"{URLPREFIX}webhook-submissions/"
-    payload = json.dumps({
+    payload = codec.dumps({
         "page": page,
         "page_size": page_size,
         "created_after": created_after,
@@ -1465,5 +1693,5 @@ def get_webhook_submissions(page=1, page_size=100, created_after=None, created_b
         "response_code": response_code,
         "webhook_id": webhook_id
     })
-    response = requests.request("GET", url, headers=get_headers, data=payload)
-    return response.json()
+    response = _send("GET", url, get_headers, data=payload)
+    return codec.loads(response.content)